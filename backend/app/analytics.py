@@ -0,0 +1,179 @@
+from collections import Counter
+from datetime import date, timedelta
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from . import particiones
+from .models import Cambio, Ejercicio, Planificacion, PlanificacionArchivo, Rutina
+
+""" Analítica de volumen de entrenamiento (series × repeticiones × kg) """
+
+# Volumen de un ejercicio; sin peso (peso corporal) cuenta como 0 kg
+VOLUMEN = Ejercicio.series * Ejercicio.repeticiones * func.coalesce(Ejercicio.peso, 0)
+
+# Resultados cacheados por versión de los datos, así que un dashboard que repite la
+# misma consulta no vuelve a agregar años de calendario mientras nada cambie.
+_cache: Dict[Tuple, object] = {}
+_cache_version: Optional[Tuple] = None
+_lock = Lock()
+
+
+def version_datos(session: Session) -> Tuple:
+    """
+    Versión compartida por todos los workers: el último token del registro de
+    cambios (que avanza con cada escritura, propia o de otro proceso) y las filas
+    archivadas (el job de archivado vacía la tabla caliente sin pasar por el registro).
+    """
+    return tuple(
+        session.exec(
+            select(
+                select(func.max(Cambio.id)).scalar_subquery(),
+                select(func.sum(PlanificacionArchivo.cantidad)).scalar_subquery(),
+            )
+        ).one()
+    )
+
+
+def _cacheado(session: Session, clave: Tuple, calcular: Callable[[], object]) -> object:
+    """Devuelve el resultado cacheado para la versión vigente o lo calcula."""
+    global _cache_version
+    version = version_datos(session)
+    with _lock:
+        if _cache_version != version:
+            _cache.clear()
+            _cache_version = version
+        if clave in _cache:
+            return _cache[clave]
+    # La versión se lee antes de calcular: el resultado nunca es más viejo que su clave
+    resultado = calcular()
+    with _lock:
+        if _cache_version == version:
+            _cache[clave] = resultado
+    return resultado
+
+
+def _inicio_semana(session: Session, fecha):
+    """Expresión SQL con el lunes de la semana de `fecha`, según el dialecto."""
+    if session.get_bind().dialect.name == "sqlite":
+        # 'weekday 0' avanza al domingo (o se queda si ya lo es); -6 días => lunes
+        return func.date(fecha, "weekday 0", "-6 days")
+    return func.date(func.date_trunc(literal_column("'week'"), fecha))
+
+
+def _fecha(valor) -> date:
+    # SQLite devuelve date() como texto ISO; Postgres como date
+    return valor if isinstance(valor, date) else date.fromisoformat(valor)
+
+
+def volumen_por_grupo(session: Session) -> dict:
+    """Volumen total agregado en SQL por rutina, por día de la semana y por ejercicio."""
+
+    def calcular() -> dict:
+        rutinas_stmt = (
+            select(Rutina.id, Rutina.nombre, func.sum(VOLUMEN).label("volumen"))
+            .join(Ejercicio, Ejercicio.rutina_id == Rutina.id)
+            .group_by(Rutina.id, Rutina.nombre)
+            .order_by(func.sum(VOLUMEN).desc(), Rutina.nombre)
+        )
+        dias_stmt = (
+            select(Ejercicio.dia_semana, func.sum(VOLUMEN).label("volumen"))
+            .group_by(Ejercicio.dia_semana)
+            .order_by(func.sum(VOLUMEN).desc())
+        )
+        ejercicios_stmt = (
+            select(Ejercicio.nombre, func.sum(VOLUMEN).label("volumen"))
+            .group_by(Ejercicio.nombre)
+            .order_by(func.sum(VOLUMEN).desc(), Ejercicio.nombre)
+        )
+        return {
+            "total": float(session.exec(select(func.coalesce(func.sum(VOLUMEN), 0))).one()),
+            "por_rutina": [
+                {"id": r.id, "nombre": r.nombre, "volumen": float(r.volumen)}
+                for r in session.exec(rutinas_stmt)
+            ],
+            "por_dia": [
+                {"dia_semana": r.dia_semana, "volumen": float(r.volumen)}
+                for r in session.exec(dias_stmt)
+            ],
+            "por_ejercicio": [
+                {"nombre": r.nombre, "volumen": float(r.volumen)}
+                for r in session.exec(ejercicios_stmt)
+            ],
+        }
+
+    return _cacheado(session, ("volumen_por_grupo",), calcular)  # type: ignore[return-value]
+
+
+def carga_semanal(
+    session: Session, desde: Optional[date] = None, hasta: Optional[date] = None
+) -> List[dict]:
+    """
+    Curva de carga semanal sobre las fechas programadas en el calendario, incluidos
+    los años archivados. Cada planificación aporta el volumen total de su rutina; la
+    suma por semana de la tabla vigente se resuelve en SQL y el archivo se suma por
+    (semana, rutina). El cambio es contra la semana calendario anterior: si esa
+    semana no tuvo sesiones cuenta como volumen 0.
+    """
+
+    def calcular() -> List[dict]:
+        volumen_rutina = (
+            select(Ejercicio.rutina_id, func.sum(VOLUMEN).label("volumen"))
+            .group_by(Ejercicio.rutina_id)
+            .subquery()
+        )
+        semana = _inicio_semana(session, Planificacion.fecha).label("semana")
+        stmt = (
+            select(
+                semana,
+                func.count(Planificacion.id).label("sesiones"),
+                func.coalesce(func.sum(volumen_rutina.c.volumen), 0).label("volumen"),
+            )
+            .select_from(Planificacion)
+            .outerjoin(volumen_rutina, volumen_rutina.c.rutina_id == Planificacion.rutina_id)
+        )
+        if desde:
+            stmt = stmt.where(Planificacion.fecha >= desde)
+        if hasta:
+            stmt = stmt.where(Planificacion.fecha <= hasta)
+        semanas: Dict[date, List] = {
+            _fecha(r.semana): [r.sesiones, float(r.volumen)] for r in session.exec(stmt.group_by(semana))
+        }
+
+        # Archivo: sesiones por (lunes, rutina) y un solo SELECT con el volumen de esas rutinas
+        sesiones_archivadas = Counter(
+            (fecha - timedelta(days=fecha.weekday()), rutina_id)
+            for _, fecha, rutina_id in particiones.archivadas_en_rango(session, desde, hasta)
+        )
+        if sesiones_archivadas:
+            ids = {rutina_id for _, rutina_id in sesiones_archivadas}
+            volumenes = dict(
+                session.exec(
+                    select(volumen_rutina.c.rutina_id, volumen_rutina.c.volumen).where(
+                        volumen_rutina.c.rutina_id.in_(ids)
+                    )
+                ).all()
+            )
+            for (lunes, rutina_id), sesiones in sesiones_archivadas.items():
+                fila = semanas.setdefault(lunes, [0, 0.0])
+                fila[0] += sesiones
+                fila[1] += sesiones * float(volumenes.get(rutina_id) or 0)
+
+        resultado = []
+        previa: Optional[Tuple[date, float]] = None
+        for lunes in sorted(semanas):
+            sesiones, volumen = semanas[lunes]
+            if previa is None:
+                cambio = None  # primera semana del rango: la anterior no se consultó
+            elif previa[0] == lunes - timedelta(days=7):
+                cambio = volumen - previa[1]
+            else:
+                cambio = volumen  # la semana calendario anterior no tuvo sesiones
+            resultado.append({"semana": lunes, "sesiones": sesiones, "volumen": volumen, "cambio": cambio})
+            previa = (lunes, volumen)
+        return resultado
+
+    return _cacheado(session, ("carga_semanal", desde, hasta), calcular)  # type: ignore[return-value]
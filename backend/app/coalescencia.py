@@ -0,0 +1,95 @@
+import asyncio
+from collections import Counter
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from .database import sesion_lote
+
+""" Single-flight: lecturas idénticas y concurrentes comparten una sola ejecución """
+
+# Lecturas caras que se coalescen (GET exacto sobre estas rutas)
+RUTAS_COALESCIBLES = frozenset({"/api/estadisticas", "/api/rutinas", "/api/rutinas/export"})
+
+# Estado por worker (un solo event loop): claves en curso y contadores
+_en_curso: Dict[Tuple[str, str], asyncio.Future] = {}
+ejecutadas: Counter = Counter()
+coalescidas: Counter = Counter()
+
+
+class CoalescenciaMiddleware:
+    """
+    Middleware ASGI: el primer GET de una clave (ruta + query normalizada) ejecuta
+    el endpoint y guarda los bytes de la respuesta; los idénticos que llegan
+    mientras está en curso esperan ese resultado en lugar de repetir las consultas.
+    Funciona igual para respuestas JSON y en streaming (se bufferizan).
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or scope["path"] not in RUTAS_COALESCIBLES
+            # Dentro de /api/batch la lectura puede depender de escrituras sin confirmar
+            or sesion_lote.get() is not None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        query = parse_qsl(scope.get("query_string", b"").decode(), keep_blank_values=False)
+        clave = (scope["path"], urlencode(sorted(query)))
+
+        pendiente = _en_curso.get(clave)
+        if pendiente is not None:
+            try:
+                encabezado, partes = await asyncio.shield(pendiente)
+            except Exception:
+                # El líder falló: esta petición se ejecuta por su cuenta
+                await self.app(scope, receive, send)
+                return
+            coalescidas[clave[0]] += 1
+            await send(encabezado)
+            await send({"type": "http.response.body", "body": b"".join(partes), "more_body": False})
+            return
+
+        futuro = asyncio.get_running_loop().create_future()
+        _en_curso[clave] = futuro
+        ejecutadas[clave[0]] += 1
+        inicio: dict = {}
+        cuerpo: List[bytes] = []
+
+        async def capturar(mensaje: dict) -> None:
+            if mensaje["type"] == "http.response.start":
+                inicio.update(mensaje)
+            elif mensaje["type"] == "http.response.body":
+                cuerpo.append(mensaje.get("body", b""))
+
+        try:
+            await self.app(scope, receive, capturar)
+        except BaseException as exc:
+            # Error o cancelación del líder: los que esperaban se ejecutan por su cuenta
+            futuro.set_exception(exc if isinstance(exc, Exception) else RuntimeError("cancelada"))
+            futuro.exception()  # marcado como recuperado aunque nadie espere
+            raise
+        else:
+            futuro.set_result((inicio, cuerpo))
+        finally:
+            _en_curso.pop(clave, None)
+
+        await send(inicio)
+        await send({"type": "http.response.body", "body": b"".join(cuerpo), "more_body": False})
+
+
+def metricas() -> dict:
+    """Contadores por ruta: ejecuciones reales, peticiones coalescidas y tasa."""
+    resultado = {}
+    for ruta in sorted(set(ejecutadas) | set(coalescidas)):
+        total = ejecutadas[ruta] + coalescidas[ruta]
+        resultado[ruta] = {
+            "ejecutadas": ejecutadas[ruta],
+            "coalescidas": coalescidas[ruta],
+            "tasa": coalescidas[ruta] / total if total else 0.0,
+        }
+    return resultado
@@ -1,12 +1,14 @@
-from typing import List, Optional, Tuple
+from datetime import date
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy import func
+from sqlalchemy import delete, event, func, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from sqlmodel import select
 
-from .models import DiaSemana, Ejercicio, Rutina, Planificacion
+from . import eventos, particiones
+from .models import Cambio, DiaSemana, Ejercicio, Rutina, Planificacion
 from .schemas import (
     EjercicioCreate,
     EjercicioUpdate,
@@ -22,36 +24,50 @@ class UniqueNameError(Exception):
     """Se lanza cuando el nombre de rutina ya existe."""
 
 
+class RutinaEnUsoError(Exception):
+    """Se lanza al borrar rutinas que siguen asignadas en el calendario."""
+
+
+def _filtrar_rutinas(
+    stmt,
+    dia_semana: Optional[DiaSemana] = None,
+    ejercicio_nombre: Optional[str] = None,
+    nombre: Optional[str] = None,
+):
+    """Aplica los filtros del listado (día, ejercicio y nombre) a una consulta sobre rutinas."""
+    # Si hay filtros por ejercicio/día, hacemos join con ejercicios
+    if dia_semana or ejercicio_nombre:
+        stmt = stmt.join(Ejercicio)
+        if dia_semana:
+            stmt = stmt.where(Ejercicio.dia_semana == dia_semana)
+        if ejercicio_nombre:
+            stmt = stmt.where(Ejercicio.nombre.ilike(f"%{ejercicio_nombre}%"))
+    if nombre:
+        stmt = stmt.where(Rutina.nombre.ilike(f"%{nombre}%"))
+    return stmt
+
+
 def listar_rutinas(
     session: Session,
     limit: int,
     offset: int,
     dia_semana: Optional[DiaSemana] = None,
     ejercicio_nombre: Optional[str] = None,
+    nombre: Optional[str] = None,
 ) -> Tuple[List[Rutina], int]:
     """Devuelve rutinas con paginación y el total para UI, con filtros opcionales."""
 
-    stmt = select(Rutina)
-    # Si hay filtros por ejercicio/día, hacemos join con ejercicios
+    stmt = _filtrar_rutinas(select(Rutina), dia_semana, ejercicio_nombre, nombre)
     if dia_semana or ejercicio_nombre:
-        stmt = stmt.join(Ejercicio)
-        if dia_semana:
-            stmt = stmt.where(Ejercicio.dia_semana == dia_semana)
-        if ejercicio_nombre:
-            stmt = stmt.where(Ejercicio.nombre.ilike(f"%{ejercicio_nombre}%"))
         stmt = stmt.distinct()
 
     stmt = stmt.order_by(Rutina.creado_en.desc()).offset(offset).limit(limit)
     items = session.exec(stmt).all()
 
     # Conteo total respetando filtros
-    count_stmt = select(func.count(func.distinct(Rutina.id)))
-    if dia_semana or ejercicio_nombre:
-        count_stmt = count_stmt.join(Ejercicio)
-        if dia_semana:
-            count_stmt = count_stmt.where(Ejercicio.dia_semana == dia_semana)
-        if ejercicio_nombre:
-            count_stmt = count_stmt.where(Ejercicio.nombre.ilike(f"%{ejercicio_nombre}%"))
+    count_stmt = _filtrar_rutinas(
+        select(func.count(func.distinct(Rutina.id))), dia_semana, ejercicio_nombre, nombre
+    )
 
     total = session.exec(count_stmt).one()
     return items, total
@@ -72,18 +88,18 @@ def buscar_rutinas(session: Session, nombre: str) -> List[Rutina]:
 def crear_rutina(session: Session, rutina_data: RutinaCreate) -> Rutina:
     """Crea una rutina y opcionalmente sus ejercicios iniciales."""
     rutina = Rutina(nombre=rutina_data.nombre, descripcion=rutina_data.descripcion)
+    # Ejercicios iniciales en memoria respetando el orden dado: se insertan en el mismo
+    # commit (INSERT ... RETURNING) y la colección queda cargada para la respuesta
+    rutina.ejercicios = [
+        _nuevo_ejercicio(None, ejercicio, orden_default=idx)
+        for idx, ejercicio in enumerate(rutina_data.ejercicios)
+    ]
     session.add(rutina)
     try:
         session.commit()
     except IntegrityError as exc:
         session.rollback()
         raise UniqueNameError from exc
-    session.refresh(rutina)
-
-    # Crear ejercicios iniciales respetando el orden dado
-    for idx, ejercicio in enumerate(rutina_data.ejercicios):
-        crear_ejercicio(session, rutina.id, ejercicio, orden_default=idx)
-    session.refresh(rutina)
     return rutina
 
 
@@ -93,27 +109,33 @@ def actualizar_rutina(session: Session, rutina: Rutina, data: RutinaUpdate) -> R
         rutina.nombre = data.nombre
     if data.descripcion is not None:
         rutina.descripcion = data.descripcion
+    # La respuesta incluye los ejercicios: se cargan en esta transacción y no en otra tras el commit
+    rutina.ejercicios
     try:
         session.add(rutina)
         session.commit()
     except IntegrityError as exc:
         session.rollback()
         raise UniqueNameError from exc
-    session.refresh(rutina)
     return rutina
 
 
 def eliminar_rutina(session: Session, rutina: Rutina) -> None:
     """Elimina rutina y ejercicios (cascada configurada en el modelo)."""
+    if session.exec(select(Planificacion.id).where(Planificacion.rutina_id == rutina.id)).first():
+        raise RutinaEnUsoError
+    # El calendario archivado también la referencia: sin ella se leería con rutina null
+    if particiones.contar_archivadas(session, [rutina.id]):
+        raise RutinaEnUsoError
     session.delete(rutina)
     session.commit()
 
 
-def crear_ejercicio(
-    session: Session, rutina_id: int, data: EjercicioCreate, orden_default: int | None = None
+def _nuevo_ejercicio(
+    rutina_id: Optional[int], data: EjercicioCreate, orden_default: int | None = None
 ) -> Ejercicio:
-    """Crea un ejercicio ligado a una rutina."""
-    ejercicio = Ejercicio(
+    """Construye (sin persistir) un ejercicio a partir del payload."""
+    return Ejercicio(
         rutina_id=rutina_id,
         nombre=data.nombre,
         dia_semana=data.dia_semana,
@@ -123,9 +145,15 @@ def crear_ejercicio(
         notas=data.notas,
         orden=data.orden if data.orden is not None else orden_default,
     )
+
+
+def crear_ejercicio(
+    session: Session, rutina_id: int, data: EjercicioCreate, orden_default: int | None = None
+) -> Ejercicio:
+    """Crea un ejercicio ligado a una rutina."""
+    ejercicio = _nuevo_ejercicio(rutina_id, data, orden_default)
     session.add(ejercicio)
     session.commit()
-    session.refresh(ejercicio)
     return ejercicio
 
 
@@ -148,7 +176,6 @@ def actualizar_ejercicio(session: Session, ejercicio: Ejercicio, data: Ejercicio
 
     session.add(ejercicio)
     session.commit()
-    session.refresh(ejercicio)
     return ejercicio
 
 
@@ -179,14 +206,9 @@ def duplicar_rutina(session: Session, rutina_id: int, nuevo_nombre: Optional[str
 
     nombre_copia = nuevo_nombre or _generar_nombre_copia(session, original.nombre)
     copia = Rutina(nombre=nombre_copia, descripcion=original.descripcion)
-    session.add(copia)
-    session.commit()
-    session.refresh(copia)
-
-    # Copiar ejercicios asociados
-    for ej in original.ejercicios:
-        nuevo_ej = Ejercicio(
-            rutina_id=copia.id,
+    # Copiar ejercicios asociados; se insertan junto con la copia en un solo commit
+    copia.ejercicios = [
+        Ejercicio(
             nombre=ej.nombre,
             dia_semana=ej.dia_semana,
             series=ej.series,
@@ -195,9 +217,10 @@ def duplicar_rutina(session: Session, rutina_id: int, nuevo_nombre: Optional[str
             notas=ej.notas,
             orden=ej.orden,
         )
-        session.add(nuevo_ej)
+        for ej in original.ejercicios
+    ]
+    session.add(copia)
     session.commit()
-    session.refresh(copia)
     return copia
 
 
@@ -237,31 +260,44 @@ def obtener_estadisticas(session: Session) -> dict:
 
 
 # Planificaciones (calendario)
-def listar_planificaciones(session: Session) -> List[Planificacion]:
-    return session.exec(select(Planificacion).order_by(Planificacion.fecha)).all()
+def listar_planificaciones(
+    session: Session, desde: Optional[date] = None, hasta: Optional[date] = None
+) -> List[Planificacion]:
+    """Calendario vigente; con rango de fechas incluye también los años archivados."""
+    return particiones.listar(session, desde=desde, hasta=hasta)
 
 #obtener planificación por fecha
 def obtener_plan_por_fecha(session: Session, fecha) -> Optional[Planificacion]:
     stmt = select(Planificacion).where(Planificacion.fecha == fecha)
     return session.exec(stmt).first()
 
+#fecha con planificación archivada (solo lectura)
+def fecha_archivada(session: Session, fecha: date) -> bool:
+    return particiones.fecha_archivada(session, fecha)
+
 #crear planificación
 def crear_planificacion(session: Session, data: PlanificacionCreate) -> Planificacion:
+    particiones.asegurar_particion(session, data.fecha)
     plan = Planificacion(fecha=data.fecha, rutina_id=data.rutina_id)
+    # La rutina ya validada está en el identity map: enlazarla evita un SELECT al serializar;
+    # sus ejercicios (también en la respuesta) se cargan antes del commit
+    plan.rutina = session.get(Rutina, data.rutina_id)
+    plan.rutina.ejercicios
     session.add(plan)
     session.commit()
-    session.refresh(plan)
     return plan
 
 #actualizar planificación
 def actualizar_planificacion(session: Session, plan: Planificacion, data: PlanificacionUpdate) -> Planificacion:
     if data.fecha is not None:
+        particiones.asegurar_particion(session, data.fecha)
         plan.fecha = data.fecha
     if data.rutina_id is not None:
         plan.rutina_id = data.rutina_id
+        plan.rutina = session.get(Rutina, data.rutina_id)
+    plan.rutina.ejercicios  # la respuesta los serializa: se cargan antes del commit
     session.add(plan)
     session.commit()
-    session.refresh(plan)
     return plan
 
 #eliminar planificación
@@ -270,3 +306,253 @@ def eliminar_planificacion(session: Session, plan: Planificacion) -> None:
     session.commit()
 
 
+# Sincronización incremental (registro de cambios + tombstones)
+# (modelo, nombre de entidad en el registro, clave en la respuesta de /api/sync)
+_MODELOS_SYNC = (
+    (Rutina, "rutina", "rutinas"),
+    (Ejercicio, "ejercicio", "ejercicios"),
+    (Planificacion, "planificacion", "planificaciones"),
+)
+ENTIDADES_SYNC = {modelo: entidad for modelo, entidad, _ in _MODELOS_SYNC}
+# Advisory lock de Postgres que ordena los commits que escriben en `cambios`
+CLAVE_LOCK_CAMBIOS = 0x63616D62  # "camb"
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_cambios(session: Session, flush_context) -> None:
+    """
+    Anota en `cambios` cada alta, modificación o borrado de rutinas, ejercicios y
+    planificaciones dentro de la misma transacción. Los ejercicios borrados por la
+    cascada de eliminar_rutina también aparecen en session.deleted, así que quedan
+    como tombstones.
+    """
+    filas = []
+    for obj in session.new:
+        if type(obj) in ENTIDADES_SYNC:
+            filas.append((obj, "upsert"))
+    for obj in session.dirty:
+        if type(obj) in ENTIDADES_SYNC and session.is_modified(obj, include_collections=False):
+            filas.append((obj, "upsert"))
+    for obj in session.deleted:
+        if type(obj) in ENTIDADES_SYNC:
+            filas.append((obj, "delete"))
+    if filas:
+        registrar_cambios(
+            session, [(ENTIDADES_SYNC[type(obj)], obj.id, operacion) for obj, operacion in filas]
+        )
+
+
+def registrar_cambios(session: Session, cambios: List[Tuple[str, int, str]]) -> None:
+    """
+    Inserta (entidad, id, operacion) en el registro; útil para escrituras fuera del ORM.
+    Cada cambio se emite además como evento del feed en vivo, con su token como versión.
+
+    El token solo sirve si los ids se confirman en orden: con una secuencia de
+    Postgres, una transacción que tomó el id 100 puede confirmar después de otra
+    que tomó el 101 y un cliente con token 101 no vería nunca el 100. Por eso en
+    Postgres las transacciones que anotan cambios toman un advisory lock hasta su
+    commit; en SQLite la base ya admite un solo escritor a la vez.
+    """
+    conexion = session.connection()
+    if conexion.dialect.name == "postgresql":
+        conexion.execute(select(func.pg_advisory_xact_lock(CLAVE_LOCK_CAMBIOS)))
+    tabla = Cambio.__table__
+    filas = [{"entidad": e, "entidad_id": i, "operacion": op} for e, i, op in cambios]
+    versiones = conexion.execute(
+        tabla.insert().returning(tabla.c.id, sort_by_parameter_order=True), filas
+    ).scalars().all()
+    eventos.encolar(
+        session,
+        [
+            {"entidad": f["entidad"], "id": f["entidad_id"], "operacion": f["operacion"], "version": v}
+            for f, v in zip(filas, versiones)
+        ],
+    )
+
+
+def cambios_desde(
+    session: Session, since: Optional[int], limit: int, solo_token: bool = False
+) -> dict:
+    """
+    Devuelve lo creado, modificado o borrado después del token `since`.
+    El coste es proporcional a los cambios (rango sobre la PK de `cambios` y
+    lecturas por id); sin token se entrega una instantánea completa, o solo el
+    token actual con `solo_token` (el cliente ya cargó su estado por otra vía).
+    """
+    if since is None:
+        token = session.exec(select(func.coalesce(func.max(Cambio.id), 0))).one()
+        if solo_token:
+            return {
+                "token": token,
+                "hay_mas": False,
+                "rutinas": [],
+                "ejercicios": [],
+                "planificaciones": [],
+                "eliminados": [],
+            }
+        return {
+            "token": token,
+            "hay_mas": False,
+            "rutinas": session.exec(select(Rutina).order_by(Rutina.id)).all(),
+            "ejercicios": session.exec(select(Ejercicio).order_by(Ejercicio.id)).all(),
+            "planificaciones": session.exec(select(Planificacion).order_by(Planificacion.id)).all(),
+            "eliminados": [],
+        }
+
+    stmt = select(Cambio).where(Cambio.id > since).order_by(Cambio.id).limit(limit + 1)
+    cambios = session.exec(stmt).all()
+    hay_mas = len(cambios) > limit
+    cambios = cambios[:limit]
+    token = cambios[-1].id if cambios else since
+
+    # Solo cuenta la última operación de cada entidad dentro del rango
+    ultima: Dict[Tuple[str, int], str] = {}
+    for cambio in cambios:
+        ultima[(cambio.entidad, cambio.entidad_id)] = cambio.operacion
+
+    resultado = {"token": token, "hay_mas": hay_mas, "eliminados": []}
+    for modelo, entidad, clave in _MODELOS_SYNC:
+        ids = [i for (e, i), op in ultima.items() if e == entidad and op == "upsert"]
+        filas = (
+            session.exec(select(modelo).where(modelo.id.in_(ids)).order_by(modelo.id)).all()
+            if ids
+            else []
+        )
+        resultado[clave] = filas
+        # Un upsert cuya fila ya no existe también se informa como borrado
+        encontrados = {f.id for f in filas}
+        resultado["eliminados"].extend(
+            {"entidad": e, "id": i}
+            for (e, i), op in ultima.items()
+            if e == entidad and (op == "delete" or i not in encontrados)
+        )
+    return resultado
+
+
+# Operaciones masivas por filtro (SQL por conjuntos, una sola transacción)
+# Ids por sentencia: por debajo del límite de parámetros de SQLite
+TAMANO_TANDA = 500
+
+
+def _tandas(ids: List[int]):
+    for inicio in range(0, len(ids), TAMANO_TANDA):
+        yield ids[inicio : inicio + TAMANO_TANDA]
+
+
+def _ids_filtrados(
+    session: Session,
+    dia_semana: Optional[DiaSemana],
+    ejercicio_nombre: Optional[str],
+    nombre: Optional[str],
+) -> List[int]:
+    # Se materializan al inicio: borrar ejercicios cambia lo que matchea el filtro
+    stmt = _filtrar_rutinas(select(Rutina.id), dia_semana, ejercicio_nombre, nombre).distinct()
+    return list(session.exec(stmt).all())
+
+
+def _contar_por_rutina(session: Session, modelo, ids: List[int]) -> int:
+    return sum(
+        session.exec(select(func.count()).select_from(modelo).where(modelo.rutina_id.in_(tanda))).one()
+        for tanda in _tandas(ids)
+    )
+
+
+def _contar_planificaciones(session: Session, ids: List[int]) -> int:
+    """Planificaciones (vigentes y archivadas) que usan alguna de las rutinas."""
+    return _contar_por_rutina(session, Planificacion, ids) + particiones.contar_archivadas(session, ids)
+
+
+def _validar_destino(session: Session, destino_id: int) -> None:
+    if not session.get(Rutina, destino_id):
+        raise HTTPException(status_code=404, detail="Rutina destino no encontrada")  # type: ignore
+
+
+def _reasignar(session: Session, ids: List[int], destino_id: int) -> Tuple[List[Tuple[str, int, str]], int]:
+    """
+    Pasa a `destino_id` las planificaciones de `ids`, también las archivadas.
+    Devuelve los cambios a registrar (solo las vigentes están en /api/sync) y el total movido.
+    """
+    cambios = []
+    for tanda in _tandas(ids):
+        movidas = session.execute(
+            update(Planificacion)
+            .where(Planificacion.rutina_id.in_(tanda))
+            .values(rutina_id=destino_id)
+            .returning(Planificacion.id)
+        ).scalars().all()
+        cambios.extend(("planificacion", plan_id, "upsert") for plan_id in movidas)
+    return cambios, len(cambios) + particiones.reasignar_archivadas(session, ids, destino_id)
+
+
+def _cerrar_masiva(session: Session, cambios: List[Tuple[str, int, str]]) -> None:
+    """Registra los cambios hechos fuera del ORM (no disparan los hooks del flush) y confirma."""
+    if cambios:
+        registrar_cambios(session, cambios)
+    session.commit()
+
+
+def eliminar_rutinas_por_filtro(
+    session: Session,
+    dia_semana: Optional[DiaSemana] = None,
+    ejercicio_nombre: Optional[str] = None,
+    nombre: Optional[str] = None,
+    reasignar_a: Optional[int] = None,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Borra las rutinas que cumplen los filtros del listado junto con sus ejercicios.
+    Las planificaciones que las usan pasan a `reasignar_a`; sin destino, si hay
+    alguna se lanza RutinaEnUsoError. Con `dry_run` solo se cuenta lo afectado.
+    """
+    ids = _ids_filtrados(session, dia_semana, ejercicio_nombre, nombre)
+    if reasignar_a is not None:
+        _validar_destino(session, reasignar_a)
+        if reasignar_a in ids:
+            raise HTTPException(status_code=400, detail="La rutina destino está entre las que se borran")  # type: ignore
+    planificaciones = _contar_planificaciones(session, ids)
+    if dry_run:
+        return {
+            "rutinas": len(ids),
+            "ejercicios": _contar_por_rutina(session, Ejercicio, ids),
+            "planificaciones": planificaciones,
+            "dry_run": True,
+        }
+    if planificaciones and reasignar_a is None:
+        raise RutinaEnUsoError
+
+    cambios = _reasignar(session, ids, reasignar_a)[0] if planificaciones else []
+    ejercicios_borrados = 0
+    for tanda in _tandas(ids):
+        ejercicios = session.execute(
+            delete(Ejercicio).where(Ejercicio.rutina_id.in_(tanda)).returning(Ejercicio.id)
+        ).scalars().all()
+        session.execute(delete(Rutina).where(Rutina.id.in_(tanda)))
+        cambios.extend(("ejercicio", ej_id, "delete") for ej_id in ejercicios)
+        cambios.extend(("rutina", rutina_id, "delete") for rutina_id in tanda)
+        ejercicios_borrados += len(ejercicios)
+    _cerrar_masiva(session, cambios)
+    return {
+        "rutinas": len(ids),
+        "ejercicios": ejercicios_borrados,
+        "planificaciones": planificaciones,
+        "dry_run": False,
+    }
+
+
+def reasignar_planificaciones_por_filtro(
+    session: Session,
+    destino_id: int,
+    dia_semana: Optional[DiaSemana] = None,
+    ejercicio_nombre: Optional[str] = None,
+    nombre: Optional[str] = None,
+    dry_run: bool = False,
+) -> dict:
+    """Pasa a `destino_id` las planificaciones de las rutinas que cumplen los filtros."""
+    _validar_destino(session, destino_id)
+    ids = [i for i in _ids_filtrados(session, dia_semana, ejercicio_nombre, nombre) if i != destino_id]
+    if dry_run:
+        planificaciones = _contar_planificaciones(session, ids)
+    else:
+        cambios, planificaciones = _reasignar(session, ids, destino_id)
+        _cerrar_masiva(session, cambios)
+    return {"rutinas": len(ids), "ejercicios": 0, "planificaciones": planificaciones, "dry_run": dry_run}
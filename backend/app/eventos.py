@@ -0,0 +1,203 @@
+import asyncio
+import json
+import select as select_io
+import threading
+import time
+from typing import AsyncIterator, List, Optional, Set
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from .database import engine
+from .models import Cambio
+
+""" Feed de cambios en vivo (SSE) con difusión entre workers """
+
+CANAL = "cambios"
+# Eventos en cola por suscriptor antes de considerarlo lento y pedirle un resync
+MAX_PENDIENTES = 256
+HEARTBEAT_SEGUNDOS = 15.0
+# Postgres corta los payloads de NOTIFY en 8000 bytes: los eventos viajan en tandas por debajo
+MAX_PAYLOAD = 7900
+# Sin LISTEN/NOTIFY (SQLite) cada worker sigue `cambios` con esta frecuencia
+SONDEO_SEGUNDOS = 0.25
+
+
+class Difusor:
+    """
+    Difusor en proceso sobre asyncio: cada suscriptor es una cola acotada, así que
+    miles de conexiones ociosas solo cuestan una cola vacía cada una. Se puede
+    publicar desde cualquier hilo (las rutas síncronas corren en el threadpool).
+    """
+
+    def __init__(self) -> None:
+        self._suscriptores: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def suscriptores(self) -> int:
+        return len(self._suscriptores)
+
+    def suscribir(self) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        cola: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDIENTES)
+        self._suscriptores.add(cola)
+        return cola
+
+    def desuscribir(self, cola: asyncio.Queue) -> None:
+        self._suscriptores.discard(cola)
+
+    def publicar(self, eventos: List[dict]) -> None:
+        """Entrega eventos a todos los suscriptores (thread-safe)."""
+        if not eventos or self._loop is None or not self._suscriptores:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._difundir, eventos)
+        except RuntimeError:
+            # El loop ya se cerró (apagado del worker)
+            pass
+
+    def _difundir(self, eventos: List[dict]) -> None:
+        for cola in list(self._suscriptores):
+            for evento in eventos:
+                try:
+                    cola.put_nowait(evento)
+                except asyncio.QueueFull:
+                    # Suscriptor lento: se descarta y se le avisa que resincronice con /api/sync
+                    self._suscriptores.discard(cola)
+                    while not cola.empty():
+                        cola.get_nowait()
+                    cola.put_nowait(None)
+                    break
+
+
+difusor = Difusor()
+
+
+def _usa_notify() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _tandas_payload(eventos: List[dict]) -> List[str]:
+    """Arreglos JSON de eventos, cada uno por debajo de MAX_PAYLOAD bytes."""
+    tandas, actual, largo = [], [], 2
+    for evento in eventos:
+        texto = json.dumps(evento, separators=(",", ":"))
+        if actual and largo + len(texto) + 1 > MAX_PAYLOAD:
+            tandas.append("[" + ",".join(actual) + "]")
+            actual, largo = [], 2
+        actual.append(texto)
+        largo += len(texto) + 1
+    if actual:
+        tandas.append("[" + ",".join(actual) + "]")
+    return tandas
+
+
+def encolar(session: Session, eventos: List[dict]) -> None:
+    """
+    Registra eventos de la transacción en curso. En Postgres se emite NOTIFY en la
+    misma transacción (Postgres solo lo entrega si hay commit), con todos los
+    eventos del flush en una sola sentencia, y cada worker los recibe con LISTEN.
+    En otros motores no hace falta nada: cada worker sigue `cambios` por su cuenta.
+    """
+    if not eventos or not _usa_notify():
+        return
+    # Un solo viaje a la base aunque el flush (p. ej. un borrado masivo) toque miles de filas
+    session.connection().execute(
+        text("SELECT pg_notify(:canal, tanda) FROM unnest(CAST(:tandas AS text[])) AS tanda"),
+        {"canal": CANAL, "tandas": _tandas_payload(eventos)},
+    )
+
+
+def _escuchar_postgres() -> None:
+    """Hilo de LISTEN: reenvía al difusor local los NOTIFY de cualquier worker."""
+    while True:
+        try:
+            cargs, cparams = engine.dialect.create_connect_args(engine.url)
+            conexion = engine.dialect.dbapi.connect(*cargs, **cparams)
+            conexion.autocommit = True
+            with conexion.cursor() as cursor:
+                cursor.execute(f"LISTEN {CANAL}")
+            while True:
+                if select_io.select([conexion], [], [], 5.0) == ([], [], []):
+                    continue
+                conexion.poll()
+                eventos = [evento for n in conexion.notifies for evento in json.loads(n.payload)]
+                conexion.notifies.clear()
+                difusor.publicar(eventos)
+        except Exception as exc:
+            print(f"[EVENTOS] LISTEN interrumpido, reintentando: {exc}")
+            time.sleep(2.0)
+
+
+def leer_cambios(token: int, limite: int = 1000) -> List[dict]:
+    """Eventos del registro de cambios posteriores a `token` (ya confirmados, de cualquier worker)."""
+    with engine.connect() as conexion:
+        filas = conexion.execute(
+            select(Cambio.id, Cambio.entidad, Cambio.entidad_id, Cambio.operacion)
+            .where(Cambio.id > token)
+            .order_by(Cambio.id)
+            .limit(limite)
+        ).all()
+    return [{"entidad": e, "id": i, "operacion": op, "version": v} for v, e, i, op in filas]
+
+
+def sondear(token: Optional[int]) -> int:
+    """Publica los cambios posteriores a `token` (None: desde el último) y devuelve el nuevo token."""
+    if token is None:
+        with engine.connect() as conexion:
+            return conexion.execute(select(func.coalesce(func.max(Cambio.id), 0))).scalar_one()
+    while True:
+        eventos = leer_cambios(token)
+        if not eventos:
+            return token
+        token = eventos[-1]["version"]
+        difusor.publicar(eventos)
+
+
+def _seguir_cambios() -> None:
+    """Hilo de sondeo (motores sin NOTIFY): el equivalente local de LISTEN entre workers."""
+    token: Optional[int] = None
+    while True:
+        try:
+            token = sondear(token)
+        except Exception as exc:
+            print(f"[EVENTOS] Sondeo de cambios interrumpido, reintentando: {exc}")
+            token = None
+        time.sleep(SONDEO_SEGUNDOS)
+
+
+_escucha_iniciada = False
+
+
+def iniciar_escucha() -> None:
+    """
+    Arranca (una vez por proceso) el hilo que trae los cambios de todos los workers:
+    LISTEN/NOTIFY en Postgres, sondeo de `cambios` en los demás motores.
+    """
+    global _escucha_iniciada
+    if _escucha_iniciada:
+        return
+    _escucha_iniciada = True
+    if _usa_notify():
+        threading.Thread(target=_escuchar_postgres, name="eventos-listen", daemon=True).start()
+    else:
+        threading.Thread(target=_seguir_cambios, name="eventos-sondeo", daemon=True).start()
+
+
+async def flujo_sse(cola: asyncio.Queue) -> AsyncIterator[str]:
+    """Serializa los eventos de un suscriptor en formato text/event-stream."""
+    try:
+        while True:
+            try:
+                evento = await asyncio.wait_for(cola.get(), timeout=HEARTBEAT_SEGUNDOS)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": ping\n\n"
+                continue
+            if evento is None:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            yield f"id: {evento['version']}\nevent: cambio\ndata: {json.dumps(evento)}\n\n"
+    finally:
+        difusor.desuscribir(cola)
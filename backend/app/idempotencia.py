@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .database import sesion_lote
+
+""" Soporte de Idempotency-Key para endpoints que escriben """
+
+METODOS = frozenset({"POST", "PUT", "DELETE"})
+# Almacén local compacto (un archivo SQLite compartido por los workers del host)
+RUTA_ALMACEN = os.getenv("IDEMPOTENCIA_DB", "idempotencia.sqlite3")
+TTL_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_TTL", str(24 * 3600)))
+# Si el worker que ejecutaba una clave muere, la reserva caduca sola; mientras vive
+# la renueva cada RENOVAR_CADA segundos, así un request largo no se ejecuta dos veces
+TTL_EN_CURSO = 60.0
+RENOVAR_CADA = TTL_EN_CURSO / 3
+ESPERA_MAXIMA = 30.0
+LIMPIEZA_CADA = 100
+
+
+class AlmacenIdempotencia:
+    """Respuestas guardadas por clave con vencimiento (TTL) en una tabla SQLite."""
+
+    def __init__(self, ruta: str) -> None:
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS claves (
+                clave TEXT PRIMARY KEY,
+                huella TEXT NOT NULL,
+                completa INTEGER NOT NULL DEFAULT 0,
+                status INTEGER,
+                headers TEXT,
+                cuerpo BLOB,
+                expira REAL NOT NULL
+            )
+            """
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS ix_claves_expira ON claves (expira)")
+        self._lock = Lock()
+        self._operaciones = 0
+
+    def reservar(self, clave: str, huella: str) -> bool:
+        """Marca la clave como en curso; False si ya existía (vigente)."""
+        ahora = time.time()
+        with self._lock:
+            self._operaciones += 1
+            if self._operaciones % LIMPIEZA_CADA == 0:
+                self._conexion.execute("DELETE FROM claves WHERE expira < ?", (ahora,))
+            else:
+                self._conexion.execute("DELETE FROM claves WHERE clave = ? AND expira < ?", (clave, ahora))
+            cursor = self._conexion.execute(
+                "INSERT OR IGNORE INTO claves (clave, huella, expira) VALUES (?, ?, ?)",
+                (clave, huella, ahora + TTL_EN_CURSO),
+            )
+            return cursor.rowcount == 1
+
+    def obtener(self, clave: str) -> Optional[tuple]:
+        """(huella, completa, status, headers, cuerpo) o None si no está o venció."""
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT huella, completa, status, headers, cuerpo FROM claves WHERE clave = ? AND expira >= ?",
+                (clave, time.time()),
+            ).fetchone()
+
+    def completar(self, clave: str, status: int, headers: List[Tuple[bytes, bytes]], cuerpo: bytes) -> None:
+        encabezados = json.dumps([(k.decode("latin-1"), v.decode("latin-1")) for k, v in headers])
+        with self._lock:
+            self._conexion.execute(
+                "UPDATE claves SET completa = 1, status = ?, headers = ?, cuerpo = ?, expira = ? WHERE clave = ?",
+                (status, encabezados, cuerpo, time.time() + TTL_SEGUNDOS, clave),
+            )
+
+    def renovar(self, clave: str, huella: str) -> None:
+        """Extiende la reserva en curso de `clave` otro TTL_EN_CURSO."""
+        with self._lock:
+            self._conexion.execute(
+                "UPDATE claves SET expira = ? WHERE clave = ? AND huella = ? AND completa = 0",
+                (time.time() + TTL_EN_CURSO, clave, huella),
+            )
+
+    def liberar(self, clave: str) -> None:
+        """Quita una reserva para que un reintento vuelva a ejecutar."""
+        with self._lock:
+            self._conexion.execute("DELETE FROM claves WHERE clave = ? AND completa = 0", (clave,))
+
+
+_almacen: Optional[AlmacenIdempotencia] = None
+
+
+def almacen() -> AlmacenIdempotencia:
+    global _almacen
+    if _almacen is None:
+        _almacen = AlmacenIdempotencia(RUTA_ALMACEN)
+    return _almacen
+
+
+async def _responder(send, status: int, headers: List[Tuple[bytes, bytes]], cuerpo: bytes) -> None:
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": cuerpo, "more_body": False})
+
+
+async def _mantener_reserva(store: AlmacenIdempotencia, clave: str, huella: str) -> None:
+    """Renueva la reserva mientras el request sigue ejecutándose (se cancela al terminar)."""
+    while True:
+        await asyncio.sleep(RENOVAR_CADA)
+        await run_in_threadpool(store.renovar, clave, huella)
+
+
+async def _error(send, status: int, detalle: str) -> None:
+    cuerpo = json.dumps({"detail": detalle}).encode()
+    await _responder(send, status, [(b"content-type", b"application/json")], cuerpo)
+
+
+class IdempotenciaMiddleware:
+    """
+    Middleware ASGI: un POST/PUT/DELETE con header Idempotency-Key se ejecuta una
+    sola vez. Los reintentos reciben la respuesta guardada sin tocar las tablas
+    principales y los duplicados concurrentes esperan a que termine el primero.
+    Las respuestas 5xx no se guardan, así el reintento vuelve a ejecutar.
+    El almacén es sqlite3 sincrónico: cada llamada corre en el threadpool para
+    no frenar el event loop.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] not in METODOS or sesion_lote.get() is not None:
+            await self.app(scope, receive, send)
+            return
+        clave_header = dict(scope["headers"]).get(b"idempotency-key")
+        if not clave_header:
+            await self.app(scope, receive, send)
+            return
+
+        # Se lee el cuerpo completo para la huella y luego se re-entrega a la app
+        partes = []
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] != "http.request":
+                return
+            partes.append(mensaje.get("body", b""))
+            if not mensaje.get("more_body"):
+                break
+        cuerpo_request = b"".join(partes)
+        entregado = False
+
+        async def receive_repetido() -> dict:
+            nonlocal entregado
+            if not entregado:
+                entregado = True
+                return {"type": "http.request", "body": cuerpo_request, "more_body": False}
+            return await receive()
+
+        clave = f"{scope['method']} {scope['path']} {clave_header.decode('latin-1')}"
+        huella = hashlib.sha256(scope.get("query_string", b"") + b"\n" + cuerpo_request).hexdigest()
+        store = almacen()
+
+        limite = time.monotonic() + ESPERA_MAXIMA
+        while not await run_in_threadpool(store.reservar, clave, huella):
+            guardada = await run_in_threadpool(store.obtener, clave)
+            if guardada is None:
+                continue  # venció o se liberó entre medio: se intenta reservar de nuevo
+            huella_guardada, completa, status, headers, cuerpo = guardada
+            if huella_guardada != huella:
+                await _error(send, 422, "Idempotency-Key ya usada con otro request")
+                return
+            if completa:
+                encabezados = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(headers)]
+                encabezados.append((b"idempotent-replayed", b"true"))
+                await _responder(send, status, encabezados, cuerpo)
+                return
+            if time.monotonic() > limite:
+                await _error(send, 409, "Hay un request con esta Idempotency-Key en curso")
+                return
+            await asyncio.sleep(0.05)
+
+        inicio: dict = {}
+        cuerpo: List[bytes] = []
+
+        async def capturar(mensaje: dict) -> None:
+            if mensaje["type"] == "http.response.start":
+                inicio.update(mensaje)
+            elif mensaje["type"] == "http.response.body":
+                cuerpo.append(mensaje.get("body", b""))
+
+        latido = asyncio.ensure_future(_mantener_reserva(store, clave, huella))
+        try:
+            await self.app(scope, receive_repetido, capturar)
+        except BaseException:
+            latido.cancel()
+            await run_in_threadpool(store.liberar, clave)
+            raise
+        latido.cancel()
+        datos = b"".join(cuerpo)
+        if inicio.get("status", 500) >= 500:
+            await run_in_threadpool(store.liberar, clave)
+        else:
+            encabezados = list(inicio.get("headers", []))
+            await run_in_threadpool(store.completar, clave, inicio["status"], encabezados, datos)
+        await _responder(send, inicio.get("status", 500), list(inicio.get("headers", [])), datos)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+from typing import List
+from urllib.parse import urlencode
+
+from fastapi import FastAPI
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import METODOS_ESCRITURA, cola_escritura, engine, engine_atomico, engine_escritura, sesion_lote
+from .schemas import LoteRequest, OperacionLote
+
+""" Ejecución de /api/batch: varias operaciones de la API en un solo request y una sesión """
+
+# Rutas que no tienen sentido dentro de un lote (recursión o streams infinitos)
+RUTAS_EXCLUIDAS = ("/api/batch", "/api/eventos")
+
+
+class RutaNoPermitida(Exception):
+    """Se lanza cuando una operación del lote apunta fuera de la API."""
+
+
+def validar_operaciones(operaciones: List[OperacionLote]) -> None:
+    for op in operaciones:
+        ruta = op.ruta.split("?", 1)[0]
+        if not ruta.startswith("/api/") or ruta.rstrip("/") in RUTAS_EXCLUIDAS:
+            raise RutaNoPermitida(op.ruta)
+
+
+async def _despachar(app: FastAPI, op: OperacionLote) -> dict:
+    """Ejecuta una operación contra la app en proceso (sin red) y junta su respuesta."""
+    ruta, _, query = op.ruta.partition("?")
+    if op.params:
+        extra = urlencode({k: v for k, v in op.params.items() if v is not None}, doseq=True)
+        query = f"{query}&{extra}" if query else extra
+    cuerpo = b"" if op.body is None else json.dumps(op.body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": op.metodo,
+        "scheme": "http",
+        "path": ruta,
+        "raw_path": ruta.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(cuerpo)).encode())],
+        "client": None,
+        "server": None,
+    }
+    enviado = False
+
+    async def receive() -> dict:
+        nonlocal enviado
+        if enviado:
+            # El "cliente" nunca se desconecta: las respuestas en streaming terminan solas
+            await asyncio.Event().wait()
+        enviado = True
+        return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+    respuesta = {"status": 500, "headers": {}, "partes": []}
+
+    async def send(mensaje: dict) -> None:
+        if mensaje["type"] == "http.response.start":
+            respuesta["status"] = mensaje["status"]
+            respuesta["headers"] = {k.decode().lower(): v.decode() for k, v in mensaje.get("headers", [])}
+        elif mensaje["type"] == "http.response.body":
+            respuesta["partes"].append(mensaje.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception as exc:  # la app ya respondió 500; se informa sin cortar el lote
+        print(f"[BATCH] Error en {op.metodo} {op.ruta}: {exc}")
+        respuesta["status"] = 500
+
+    datos = b"".join(respuesta["partes"])
+    if not datos:
+        body = None
+    elif respuesta["headers"].get("content-type", "").startswith("application/json"):
+        body = json.loads(datos)
+    else:
+        body = datos.decode("utf-8", "replace")
+    return {"status": respuesta["status"], "body": body}
+
+
+async def ejecutar_lote(app: FastAPI, lote: LoteRequest) -> dict:
+    """
+    Corre las operaciones en orden sobre una sola sesión y conexión. Con `atomico`
+    todo va en una transacción: los commits de cada operación pasan a ser
+    savepoints y ante el primer error (status >= 400) se revierte el lote entero.
+    """
+    validar_operaciones(lote.operaciones)
+    escribe = any(op.metodo in METODOS_ESCRITURA for op in lote.operaciones)
+    # Con el perfil SQLite ajustado un lote que escribe ocupa la cola de escritura entera
+    serializar = escribe and engine_escritura is not engine
+    if serializar:
+        await cola_escritura.acquire()
+    # Una sola conexión del pool para todo el lote, aunque cada operación haga commit
+    motor = (engine_atomico if lote.atomico else engine_escritura) if escribe else engine
+    try:
+        conexion = await run_in_threadpool(motor.connect)
+    except BaseException:
+        if serializar:
+            cola_escritura.release()
+        raise
+    transaccion = None
+    if lote.atomico:
+        transaccion = await run_in_threadpool(conexion.begin)
+        session = Session(
+            bind=conexion, join_transaction_mode="create_savepoint", expire_on_commit=False
+        )
+    else:
+        session = Session(bind=conexion, expire_on_commit=False)
+
+    resultados = []
+    confirmado = True
+    token = sesion_lote.set(session)
+    try:
+        for op in lote.operaciones:
+            if not confirmado:
+                resultados.append(
+                    {"status": 424, "body": {"detail": "No ejecutada: falló una operación anterior"}}
+                )
+                continue
+            resultado = await _despachar(app, op)
+            resultados.append(resultado)
+            if resultado["status"] >= 400:
+                if lote.atomico:
+                    confirmado = False
+                else:
+                    # Deja la sesión limpia para la siguiente operación
+                    await run_in_threadpool(session.rollback)
+    finally:
+        sesion_lote.reset(token)
+        if lote.atomico:
+            if confirmado:
+                await run_in_threadpool(transaccion.commit)
+            else:
+                await run_in_threadpool(transaccion.rollback)
+        await run_in_threadpool(session.close)
+        await run_in_threadpool(conexion.close)
+        if serializar:
+            cola_escritura.release()
+
+    return {"confirmado": confirmado, "resultados": resultados}
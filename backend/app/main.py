@@ -1,33 +1,52 @@
+from datetime import date
+
 from fastapi import Depends, FastAPI, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import io
 import csv
-from fpdf import FPDF
+import threading
 
-from . import crud
-from .database import get_session, init_db
+from . import analytics, coalescencia, crud, eventos, idempotencia, lote, similares, sugerencias
+from .database import LEAN_STARTUP, calentar_pool, engine, get_session, init_db
 from .models import DiaSemana, Ejercicio, Rutina, Planificacion
 from .schemas import (
     EjercicioCreate,
     EjercicioRead,
     EjercicioUpdate,
     EstadisticasResponse,
+    SugerenciaEjercicio,
+    CargaSemanal,
+    VolumenResponse,
     RutinaCreate,
     RutinaListResponse,
     RutinaRead,
+    RutinaSimilar,
     RutinaUpdate,
     RutinaDuplicatePayload,
+    EliminacionMasiva,
+    ReasignacionMasiva,
+    ResultadoMasivo,
     PlanificacionCreate,
     PlanificacionRead,
     PlanificacionUpdate,
+    SyncResponse,
+    LoteRequest,
+    LoteResponse,
 )
 """ endpoints principales. """
 
 # Configuración base de la aplicación FastAPI
 app = FastAPI(title="API de Rutinas de Gimnasio", version="1.0.0")
 
+# Lecturas caras idénticas y concurrentes comparten una sola ejecución
+# (se registra antes que CORS para quedar por dentro: cada petición recibe sus propios headers CORS)
+app.add_middleware(coalescencia.CoalescenciaMiddleware)
+
+# Reintentos con Idempotency-Key devuelven la respuesta guardada en vez de repetir la escritura
+app.add_middleware(idempotencia.IdempotenciaMiddleware)
+
 # CORS abierto para facilitar pruebas desde cualquier origen
 app.add_middleware(
     CORSMiddleware,
@@ -40,8 +59,16 @@ app.add_middleware(
 
 @app.on_event("startup")
 def on_startup() -> None:
-    """Se ejecuta al arrancar: crea tablas si no existen."""
-    init_db()
+    """
+    Se ejecuta al arrancar: crea tablas si no existen (salvo con LEAN_STARTUP, donde
+    se crean con `python -m app.database`), calienta el pool y arma el índice de
+    similares en segundo plano y escucha cambios de otros workers.
+    """
+    if not LEAN_STARTUP:
+        init_db()
+    threading.Thread(target=calentar_pool, name="calentar-pool", daemon=True).start()
+    similares.indice.construir_en_segundo_plano(engine)
+    eventos.iniciar_escucha()
 
 
 @app.get("/")
@@ -56,6 +83,23 @@ def health_check():
     return {"status": "ok", "message": "Servidor funcionando correctamente"}
 
 
+@app.post("/api/batch", response_model=LoteResponse)
+async def ejecutar_lote(data: LoteRequest) -> LoteResponse:
+    """Ejecuta varias operaciones de la API en orden, con una sola sesión (opcionalmente atómicas)."""
+    try:
+        return await lote.ejecutar_lote(app, data)
+    except lote.RutaNoPermitida as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Ruta no permitida en un lote: {exc}"
+        )
+
+
+@app.get("/api/metricas/coalescencia")
+def metricas_coalescencia() -> dict:
+    """Contadores de coalescencia (single-flight) por ruta en este worker."""
+    return coalescencia.metricas()
+
+
 # Rutinas
 @app.get("/api/rutinas", response_model=RutinaListResponse)
 def listar_rutinas(
@@ -63,6 +107,7 @@ def listar_rutinas(
     offset: int = Query(0, ge=0),
     dia_semana: DiaSemana | None = Query(None),
     ejercicio: str | None = Query(None, min_length=1),
+    nombre: str | None = Query(None, min_length=1),
     session: Session = Depends(get_session),
 ) -> RutinaListResponse:
     """Listar rutinas con paginación (limit/offset) y filtros opcionales."""
@@ -72,6 +117,7 @@ def listar_rutinas(
         offset=offset,
         dia_semana=dia_semana,
         ejercicio_nombre=ejercicio,
+        nombre=nombre,
     )
     return {"items": items, "total": total, "limit": limit, "offset": offset}
 
@@ -130,8 +176,10 @@ def exportar_rutinas(
             headers={"Content-Disposition": 'attachment; filename="rutinas.csv"'},
         )
 
-    # PDF
+    # PDF (fpdf se importa recién aquí: es pesado y solo lo usa esta exportación)
     try:
+        from fpdf import FPDF
+
         pdf = FPDF()
         pdf.add_page()
         pdf.set_auto_page_break(auto=True, margin=12)
@@ -214,6 +262,26 @@ def obtener_rutina(rutina_id: int, session: Session = Depends(get_session)) -> R
     return rutina
 
 
+@app.get("/api/rutinas/{rutina_id}/similares", response_model=list[RutinaSimilar])
+def rutinas_similares(
+    rutina_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    session: Session = Depends(get_session),
+) -> list[RutinaSimilar]:
+    """Rutinas con ejercicios parecidos (nombre, día, series/reps), de más a menos similar."""
+    if not session.get(Rutina, rutina_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rutina no encontrada")
+    try:
+        return similares.indice.similares(session, rutina_id, limit=limit)
+    except similares.IndiceNoListo:
+        # El índice se arma en segundo plano (al arrancar o tras invalidarlo)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Índice de similares en construcción",
+            headers={"Retry-After": "1"},
+        )
+
+
 @app.post("/api/rutinas", response_model=RutinaRead, status_code=status.HTTP_201_CREATED)
 def crear_rutina(rutina: RutinaCreate, session: Session = Depends(get_session)) -> Rutina:
     """Crear rutina (con ejercicios opcionales)."""
@@ -254,18 +322,60 @@ def obtener_estadisticas(session: Session = Depends(get_session)) -> Estadistica
     """Estadísticas básicas: totales, top rutinas y días más entrenados."""
     return crud.obtener_estadisticas(session)
 
-"""Lista todas las planificaciones (rutinas programadas en fechas), con sus rutinas asociadas."""
+@app.get("/api/estadisticas/volumen", response_model=VolumenResponse)
+def obtener_volumen(session: Session = Depends(get_session)) -> VolumenResponse:
+    """Volumen de entrenamiento (series × reps × kg) por rutina, día y ejercicio."""
+    return analytics.volumen_por_grupo(session)
+
+
+@app.get("/api/estadisticas/carga-semanal", response_model=list[CargaSemanal])
+def obtener_carga_semanal(
+    desde: date | None = Query(None),
+    hasta: date | None = Query(None),
+    session: Session = Depends(get_session),
+) -> list[CargaSemanal]:
+    """Curva de carga semanal según las fechas programadas en el calendario."""
+    return analytics.carga_semanal(session, desde=desde, hasta=hasta)
+
+@app.get("/api/sync", response_model=SyncResponse)
+def sincronizar(
+    since: int | None = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=5000),
+    solo_token: bool = Query(False),
+    session: Session = Depends(get_session),
+) -> SyncResponse:
+    """Sincronización incremental: cambios y tombstones posteriores al token `since`."""
+    return crud.cambios_desde(session, since=since, limit=limit, solo_token=solo_token)
+
+@app.get("/api/eventos")
+async def feed_eventos() -> StreamingResponse:
+    """Feed SSE de cambios (entidad, id, operacion, version) para actualizar la UI en vivo."""
+    cola = eventos.difusor.suscribir()
+    return StreamingResponse(
+        eventos.flujo_sse(cola),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+"""Lista las planificaciones (rutinas programadas en fechas) con sus rutinas; desde/hasta filtran e incluyen años archivados."""
 @app.get("/api/planificaciones", response_model=list[PlanificacionRead])
-def listar_planificaciones(session: Session = Depends(get_session)) -> list[PlanificacionRead]:
-    return crud.listar_planificaciones(session)
+def listar_planificaciones(
+    desde: date | None = Query(None),
+    hasta: date | None = Query(None),
+    session: Session = Depends(get_session),
+) -> list[PlanificacionRead]:
+    return crud.listar_planificaciones(session, desde=desde, hasta=hasta)
 
 
 @app.post("/api/planificaciones", response_model=PlanificacionRead, status_code=201)
 def crear_planificacion(data: PlanificacionCreate, session: Session = Depends(get_session)) -> Planificacion:
     # Validar que la rutina exista
-    if not crud.obtener_rutina(session, data.rutina_id):
+    rutina = crud.obtener_rutina(session, data.rutina_id)
+    if not rutina:
         raise HTTPException(status_code=404, detail="Rutina no encontrada")
     existente = crud.obtener_plan_por_fecha(session, data.fecha)
+    if not existente and crud.fecha_archivada(session, data.fecha):
+        raise HTTPException(status_code=409, detail="La fecha pertenece al archivo del calendario")
     if existente:
         # Si ya existe para esa fecha, actualizar
         return crud.actualizar_planificacion(session, existente, PlanificacionUpdate(rutina_id=data.rutina_id))
@@ -280,8 +390,11 @@ def actualizar_planificacion(
     plan = session.get(Planificacion, plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Planificación no encontrada")
-    if data.rutina_id and not crud.obtener_rutina(session, data.rutina_id):
+    rutina = crud.obtener_rutina(session, data.rutina_id) if data.rutina_id else None
+    if data.rutina_id and not rutina:
         raise HTTPException(status_code=404, detail="Rutina no encontrada")
+    if data.fecha and data.fecha != plan.fecha and crud.fecha_archivada(session, data.fecha):
+        raise HTTPException(status_code=409, detail="La fecha pertenece al archivo del calendario")
     return crud.actualizar_planificacion(session, plan, data)
 
 """Elimina una planificación del calendario sin afectar la rutina original."""
@@ -296,90 +409,54 @@ def eliminar_planificacion(plan_id: int, session: Session = Depends(get_session)
 
 
 
-@app.get("/api/rutinas/export")
-def exportar_rutinas(
-    formato: str = Query("csv", pattern="^(csv|pdf)$"),
-    session: Session = Depends(get_session),
-):
-    rutinas = _fetch_rutinas_completas(session)
-
-    if formato == "csv":
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow(
-            ["rutina_id", "nombre", "descripcion", "creado_en", "ejercicio", "dia", "series", "repeticiones", "peso", "notas", "orden"]
-        )
-        for r in rutinas:
-            for ej in r.ejercicios:
-                writer.writerow(
-                    [
-                        r.id,
-                        r.nombre,
-                        r.descripcion or "",
-                        r.creado_en,
-                        ej.nombre,
-                        ej.dia_semana,
-                        ej.series,
-                        ej.repeticiones,
-                        ej.peso or "",
-                        ej.notas or "",
-                        ej.orden or "",
-                    ]
-                )
-            if not r.ejercicios:
-                writer.writerow([r.id, r.nombre, r.descripcion or "", r.creado_en, "", "", "", "", "", "", ""])
-        buffer.seek(0)
-        return StreamingResponse(
-            iter([buffer.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": 'attachment; filename="rutinas.csv"'},
-        )
-
-    # PDF
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Rutinas de Gimnasio", ln=1)
-    pdf.set_font("Arial", "", 11)
-
-    for r in rutinas:
-        pdf.set_text_color(30, 64, 175)
-        pdf.cell(0, 8, f"Rutina: {r.nombre} (ID {r.id})", ln=1)
-        pdf.set_text_color(51, 65, 85)
-        if r.descripcion:
-            pdf.multi_cell(0, 6, f"Desc: {r.descripcion}")
-        pdf.set_text_color(15, 23, 42)
-        if r.ejercicios:
-            for ej in r.ejercicios:
-                linea = f"- {ej.dia_semana}: {ej.nombre} {ej.series}x{ej.repeticiones}"
-                if ej.peso:
-                    linea += f" @ {ej.peso}kg"
-                if ej.orden:
-                    linea += f" (orden {ej.orden})"
-                pdf.cell(0, 6, linea, ln=1)
-                if ej.notas:
-                    pdf.set_text_color(100, 116, 139)
-                    pdf.multi_cell(0, 5, f"  Notas: {ej.notas}")
-                    pdf.set_text_color(15, 23, 42)
-        else:
-            pdf.cell(0, 6, "Sin ejercicios", ln=1)
-        pdf.ln(4)
-
-    pdf_bytes = pdf.output(dest="S").encode("latin-1")
-    return StreamingResponse(
-        io.BytesIO(pdf_bytes),
-        media_type="application/pdf",
-        headers={"Content-Disposition": 'attachment; filename="rutinas.pdf"'},
-    )
-
-
 @app.delete("/api/rutinas/{rutina_id}", status_code=status.HTTP_204_NO_CONTENT)
 def eliminar_rutina(rutina_id: int, session: Session = Depends(get_session)) -> None:
     """Eliminar rutina y sus ejercicios (cascada)."""
     rutina = crud.obtener_rutina(session, rutina_id)
     if not rutina:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rutina no encontrada")
-    crud.eliminar_rutina(session, rutina)
+    try:
+        crud.eliminar_rutina(session, rutina)
+    except crud.RutinaEnUsoError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="La rutina tiene planificaciones asignadas"
+        )
+
+
+@app.post("/api/rutinas/eliminar", response_model=ResultadoMasivo)
+def eliminar_rutinas_por_filtro(
+    data: EliminacionMasiva, session: Session = Depends(get_session)
+) -> ResultadoMasivo:
+    """Borrar en bloque las rutinas que cumplen los filtros del listado (dry_run: solo contar)."""
+    try:
+        return crud.eliminar_rutinas_por_filtro(
+            session,
+            dia_semana=data.dia_semana,
+            ejercicio_nombre=data.ejercicio,
+            nombre=data.nombre,
+            reasignar_a=data.reasignar_a,
+            dry_run=data.dry_run,
+        )
+    except crud.RutinaEnUsoError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hay planificaciones con esas rutinas; indicar reasignar_a",
+        )
+
+
+@app.post("/api/rutinas/reasignar", response_model=ResultadoMasivo)
+def reasignar_planificaciones(
+    data: ReasignacionMasiva, session: Session = Depends(get_session)
+) -> ResultadoMasivo:
+    """Pasar a otra rutina las planificaciones de las rutinas que cumplen los filtros."""
+    return crud.reasignar_planificaciones_por_filtro(
+        session,
+        data.destino_id,
+        dia_semana=data.dia_semana,
+        ejercicio_nombre=data.ejercicio,
+        nombre=data.nombre,
+        dry_run=data.dry_run,
+    )
 
 
 # Ejercicios
@@ -398,6 +475,16 @@ def agregar_ejercicio(
     return crud.crear_ejercicio(session, rutina_id, data)
 
 
+@app.get("/api/ejercicios/sugerencias", response_model=list[SugerenciaEjercicio])
+def sugerir_ejercicios(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    session: Session = Depends(get_session),
+) -> list[SugerenciaEjercicio]:
+    """Autocompletado de nombres de ejercicio (prefijo y coincidencias aproximadas)."""
+    return sugerencias.indice.sugerir(session, q, limit=limit)
+
+
 @app.put("/api/ejercicios/{ejercicio_id}", response_model=EjercicioRead)
 def actualizar_ejercicio(
     ejercicio_id: int, data: EjercicioUpdate, session: Session = Depends(get_session)
@@ -416,5 +503,3 @@ def eliminar_ejercicio(ejercicio_id: int, session: Session = Depends(get_session
     if not ejercicio:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ejercicio no encontrado")
     crud.eliminar_ejercicio(session, ejercicio)
-
-
@@ -3,7 +3,7 @@ from enum import Enum
 from typing import List, Optional
 
 from sqlmodel import Column, DateTime, Field, Relationship, SQLModel
-from sqlalchemy import Date
+from sqlalchemy import Date, LargeBinary
 
 """ Modelos y validacionesde la base de datos """
 
@@ -69,3 +69,27 @@ class Planificacion(SQLModel, table=True):
     rutina: Optional[Rutina] = Relationship()
 
 
+
+
+class Cambio(SQLModel, table=True):
+    """Registro append-only de cambios; su id es el token monotónico de sincronización."""
+
+    __tablename__ = "cambios"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entidad: str  # "rutina" | "ejercicio" | "planificacion"
+    entidad_id: int
+    operacion: str  # "upsert" | "delete"
+
+
+class PlanificacionArchivo(SQLModel, table=True):
+    """Planificaciones de un año ya archivado, comprimidas (zlib sobre JSON) en una sola fila."""
+
+    __tablename__ = "planificaciones_archivo"
+
+    anio: int = Field(primary_key=True)
+    cantidad: int
+    datos: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    archivado_en: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), default=datetime.utcnow)
+    )
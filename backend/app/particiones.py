@@ -0,0 +1,296 @@
+import argparse
+import json
+import zlib
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, selectinload
+from sqlmodel import SQLModel, select
+
+from .models import Planificacion, PlanificacionArchivo, Rutina
+
+"""
+Calendario particionado por año y archivo comprimido de años viejos.
+
+- PostgreSQL: `planificaciones` es una tabla con particiones nativas por rango
+  (una por año, `planificaciones_AAAA`), creadas a demanda. Archivar un año
+  desacopla y borra su partición entera.
+- SQLite: no hay particiones nativas; la tabla caliente con índice en `fecha`
+  cumple el mismo papel (los rangos de fechas solo recorren su tramo del índice)
+  y los años viejos salen de ella al archivo.
+
+En ambos motores el archivo guarda una fila por año en `planificaciones_archivo`
+y sigue siendo consultable por GET /api/planificaciones?desde&hasta. Las fechas
+archivadas son de solo lectura: no se puede planificar de nuevo sobre ellas.
+"""
+
+# Años que se mantienen "calientes" por defecto al archivar (el actual y el anterior)
+ANIOS_CALIENTES = 2
+
+# Serializa la creación de particiones entre transacciones (advisory lock de Postgres)
+CLAVE_LOCK_PARTICIONES = 0x70617274  # "part"
+# Si `planificaciones` está particionada no cambia en la vida del proceso
+_particionada: Optional[bool] = None
+
+
+def _es_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def _crear_particion(conn: Connection, anio: int) -> None:
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS planificaciones_{anio:d} PARTITION OF planificaciones "
+            f"FOR VALUES FROM ('{anio:d}-01-01') TO ('{anio + 1:d}-01-01')"
+        )
+    )
+
+
+def crear_esquema(engine: Engine) -> None:
+    """
+    create_all con `planificaciones` particionada en Postgres. Solo aplica a una base
+    nueva: una tabla existente sin particionar se deja como está.
+    """
+    if not _es_postgres(engine):
+        SQLModel.metadata.create_all(engine)
+        return
+    tabla = Planificacion.__table__
+    SQLModel.metadata.create_all(
+        engine, tables=[t for t in SQLModel.metadata.sorted_tables if t is not tabla]
+    )
+    with engine.begin() as conn:
+        existe = conn.execute(text("SELECT to_regclass('planificaciones')")).scalar()
+        if existe is None:
+            # La PK debe incluir la clave de partición; el ORM sigue identificando por id
+            conn.execute(
+                text(
+                    "CREATE TABLE planificaciones ("
+                    " id SERIAL NOT NULL,"
+                    " fecha DATE NOT NULL,"
+                    " rutina_id INTEGER NOT NULL REFERENCES rutinas (id),"
+                    " PRIMARY KEY (id, fecha)"
+                    ") PARTITION BY RANGE (fecha)"
+                )
+            )
+            conn.execute(text("CREATE UNIQUE INDEX ix_planificaciones_fecha ON planificaciones (fecha)"))
+        particionada = conn.execute(
+            text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'planificaciones'::regclass")
+        ).scalar()
+        if particionada:
+            actual = date.today().year
+            for anio in range(actual - 1, actual + 2):
+                _crear_particion(conn, anio)
+
+
+def asegurar_particion(session: Session, fecha: date) -> None:
+    """
+    Crea la partición del año de `fecha` si no existe, dentro de la transacción
+    del request: otra conexión esperaría el lock que esta sesión ya tiene sobre
+    `planificaciones`. No se confía en una caché por proceso porque el job de
+    archivado (u otro worker) puede haber borrado la partición.
+    """
+    global _particionada
+    conn = session.connection()
+    if not _es_postgres(conn):
+        return
+    if _particionada is None:
+        _particionada = bool(
+            conn.execute(
+                text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'planificaciones'::regclass")
+            ).scalar()
+        )
+    if not _particionada:
+        return
+    existe = text(f"SELECT to_regclass('planificaciones_{fecha.year:d}')")
+    if conn.execute(existe).scalar() is not None:
+        return
+    # Dos requests del mismo año nuevo no deben crearla a la vez; el lock dura hasta el commit
+    conn.execute(select(func.pg_advisory_xact_lock(CLAVE_LOCK_PARTICIONES)))
+    if conn.execute(existe).scalar() is None:
+        _crear_particion(conn, fecha.year)
+
+
+def fecha_archivada(session: Session, fecha: date) -> bool:
+    """True si `fecha` tiene una planificación en el archivo de su año."""
+    archivo = session.get(PlanificacionArchivo, fecha.year)
+    return archivo is not None and any(f == fecha for _, f, _ in _descomprimir(archivo.datos))
+
+
+def _comprimir(filas: List[Tuple[int, date, int]]) -> bytes:
+    return zlib.compress(
+        json.dumps([[i, f.isoformat(), r] for i, f, r in filas], separators=(",", ":")).encode(), 9
+    )
+
+
+def _descomprimir(datos: bytes) -> List[Tuple[int, date, int]]:
+    return [(i, date.fromisoformat(f), r) for i, f, r in json.loads(zlib.decompress(datos))]
+
+
+def contar_archivadas(session: Session, rutina_ids: Iterable[int]) -> int:
+    """Planificaciones archivadas que usan alguna de `rutina_ids`."""
+    ids = set(rutina_ids)
+    if not ids:
+        return 0
+    archivos = session.exec(select(PlanificacionArchivo))
+    return sum(r in ids for archivo in archivos for _, _, r in _descomprimir(archivo.datos))
+
+
+def reasignar_archivadas(session: Session, rutina_ids: Iterable[int], destino_id: int) -> int:
+    """
+    Pasa a `destino_id` las planificaciones archivadas de `rutina_ids` reescribiendo
+    la fila de cada año afectado (sin commit). Devuelve cuántas se movieron.
+    """
+    ids = set(rutina_ids)
+    movidas = 0
+    if not ids:
+        return movidas
+    for archivo in session.exec(select(PlanificacionArchivo)):
+        filas = _descomprimir(archivo.datos)
+        del_anio = sum(r in ids for _, _, r in filas)
+        if del_anio:
+            archivo.datos = _comprimir([(i, f, destino_id if r in ids else r) for i, f, r in filas])
+            session.add(archivo)
+            movidas += del_anio
+    return movidas
+
+
+def archivar(session: Session, antes_de_anio: Optional[int] = None) -> Dict[int, int]:
+    """
+    Mueve al archivo todos los años anteriores a `antes_de_anio` (por defecto se
+    conservan los ANIOS_CALIENTES más recientes). Devuelve {año: filas archivadas}.
+    Es idempotente: si un año ya archivado recibió filas nuevas, se fusionan.
+    """
+    if antes_de_anio is None:
+        antes_de_anio = date.today().year - ANIOS_CALIENTES + 1
+    corte = date(antes_de_anio, 1, 1)
+    bind = session.get_bind()
+
+    filas = session.exec(
+        select(Planificacion.id, Planificacion.fecha, Planificacion.rutina_id)
+        .where(Planificacion.fecha < corte)
+        .order_by(Planificacion.fecha)
+    ).all()
+    por_anio: Dict[int, List[Tuple[int, date, int]]] = {}
+    for fila in filas:
+        por_anio.setdefault(fila.fecha.year, []).append((fila.id, fila.fecha, fila.rutina_id))
+
+    for anio, nuevas in por_anio.items():
+        archivo = session.get(PlanificacionArchivo, anio)
+        if archivo:
+            previas = {f: (i, f, r) for i, f, r in _descomprimir(archivo.datos)}
+            previas.update({f: (i, f, r) for i, f, r in nuevas})
+            combinadas = sorted(previas.values(), key=lambda fila: fila[1])
+            archivo.datos = _comprimir(combinadas)
+            archivo.cantidad = len(combinadas)
+        else:
+            session.add(PlanificacionArchivo(anio=anio, cantidad=len(nuevas), datos=_comprimir(nuevas)))
+    session.flush()
+
+    if _es_postgres(bind):
+        # Particiones completas: desacoplar y borrar es O(1) frente a borrar fila a fila
+        viejas = session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'planificaciones'::regclass"
+            )
+        ).scalars().all()
+        for nombre in viejas:
+            sufijo = nombre.rsplit("_", 1)[-1]
+            if sufijo.isdigit() and int(sufijo) < antes_de_anio:
+                session.execute(text(f"ALTER TABLE planificaciones DETACH PARTITION {nombre}"))
+                session.execute(text(f"DROP TABLE {nombre}"))
+    # Filas que no estaban en una partición anual (o motores sin particiones)
+    session.execute(delete(Planificacion).where(Planificacion.fecha < corte))
+    # Tombstones: para /api/sync y el feed en vivo las filas archivadas dejan de estar vigentes
+    if filas:
+        from .crud import registrar_cambios
+
+        registrar_cambios(session, [("planificacion", fila.id, "delete") for fila in filas])
+    session.commit()
+    return {anio: len(nuevas) for anio, nuevas in por_anio.items()}
+
+
+def archivadas_en_rango(
+    session: Session, desde: Optional[date] = None, hasta: Optional[date] = None
+) -> List[Tuple[int, date, int]]:
+    """(id, fecha, rutina_id) archivadas dentro del rango; solo se leen los años que lo intersecan."""
+    stmt = select(PlanificacionArchivo)
+    if desde:
+        stmt = stmt.where(PlanificacionArchivo.anio >= desde.year)
+    if hasta:
+        stmt = stmt.where(PlanificacionArchivo.anio <= hasta.year)
+    return [
+        fila
+        for archivo in session.exec(stmt)
+        for fila in _descomprimir(archivo.datos)
+        if (not desde or fila[1] >= desde) and (not hasta or fila[1] <= hasta)
+    ]
+
+
+def listar(
+    session: Session, desde: Optional[date] = None, hasta: Optional[date] = None
+) -> List[Planificacion]:
+    """
+    Planificaciones ordenadas por fecha. El rango se resuelve con el índice de
+    `fecha` (y poda de particiones en Postgres), así que el mes actual cuesta lo
+    mismo con o sin años de historia. Sin rango se devuelve el calendario vigente;
+    con rango también se leen los años archivados que lo intersecan.
+    """
+    stmt = select(Planificacion).options(
+        selectinload(Planificacion.rutina).selectinload(Rutina.ejercicios)
+    )
+    if desde:
+        stmt = stmt.where(Planificacion.fecha >= desde)
+    if hasta:
+        stmt = stmt.where(Planificacion.fecha <= hasta)
+    vigentes = session.exec(stmt.order_by(Planificacion.fecha)).all()
+    if not desde and not hasta:
+        return vigentes
+
+    archivadas = archivadas_en_rango(session, desde, hasta)
+    if not archivadas:
+        return vigentes
+
+    # Una fila vigente para la misma fecha tiene prioridad sobre la archivada
+    fechas_vigentes = {p.fecha for p in vigentes}
+    archivadas = [fila for fila in archivadas if fila[1] not in fechas_vigentes]
+    ids_rutinas = {r for _, _, r in archivadas}
+    rutinas = {
+        r.id: r
+        for r in session.exec(
+            select(Rutina).where(Rutina.id.in_(ids_rutinas)).options(selectinload(Rutina.ejercicios))
+        )
+    }
+    # Objetos transitorios (no se agregan a la sesión): solo para serializar la respuesta
+    reconstruidas = [
+        Planificacion(id=i, fecha=f, rutina_id=r, rutina=rutinas.get(r)) for i, f, r in archivadas
+    ]
+    return sorted([*vigentes, *reconstruidas], key=lambda p: p.fecha)
+
+
+def main() -> None:
+    from sqlmodel import Session as SesionSQLModel
+
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Archiva planificaciones de años viejos.")
+    parser.add_argument(
+        "--antes-de",
+        type=int,
+        default=None,
+        help=f"archiva los años anteriores a este (por defecto conserva {ANIOS_CALIENTES} años)",
+    )
+    args = parser.parse_args()
+    with SesionSQLModel(engine) as session:
+        resultado = archivar(session, antes_de_anio=args.antes_de)
+    if not resultado:
+        print("Nada para archivar")
+    for anio, cantidad in sorted(resultado.items()):
+        print(f"✓ {anio}: {cantidad} planificaciones archivadas")
+
+
+if __name__ == "__main__":
+    # Job de archivado: python -m app.particiones [--antes-de AAAA]
+    main()
@@ -1,8 +1,8 @@
 from datetime import datetime
 from datetime import date
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, root_validator, validator
 
 from .models import DiaSemana
 
@@ -62,6 +62,13 @@ class EjercicioUpdate(BaseModel):
         return value
 
 
+class SugerenciaEjercicio(BaseModel):
+    """Nombre de ejercicio sugerido y cuántas veces se usa."""
+
+    nombre: str
+    frecuencia: int
+
+
 class EjercicioRead(EjercicioBase):
     """Respuesta al cliente con IDs incluidos."""
 
@@ -113,6 +120,51 @@ class RutinaListResponse(BaseModel):
     offset: int
 
 
+class RutinaSimilar(BaseModel):
+    """Rutina parecida a otra y su similitud de Jaccard (0..1) sobre los ejercicios."""
+
+    id: int
+    nombre: str
+    similitud: float
+
+
+class FiltroRutinas(BaseModel):
+    """Filtros del listado de rutinas usados por las operaciones masivas."""
+
+    dia_semana: Optional[DiaSemana] = None
+    ejercicio: Optional[str] = Field(None, min_length=1)
+    nombre: Optional[str] = Field(None, min_length=1)
+    dry_run: bool = False
+
+    @root_validator(skip_on_failure=True)
+    def validar_algun_filtro(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        # Sin filtros la operación alcanzaría a todo el catálogo
+        if not (values.get("dia_semana") or values.get("ejercicio") or values.get("nombre")):
+            raise ValueError("Indicar al menos un filtro (dia_semana, ejercicio o nombre)")
+        return values
+
+
+class EliminacionMasiva(FiltroRutinas):
+    """Borrado por filtro; `reasignar_a` recibe las planificaciones de las rutinas borradas."""
+
+    reasignar_a: Optional[int] = None
+
+
+class ReasignacionMasiva(FiltroRutinas):
+    """Re-asignación por filtro de planificaciones a la rutina `destino_id`."""
+
+    destino_id: int
+
+
+class ResultadoMasivo(BaseModel):
+    """Cantidades afectadas (o que se afectarían, con dry_run) por una operación masiva."""
+
+    rutinas: int
+    ejercicios: int
+    planificaciones: int
+    dry_run: bool
+
+
 class RutinaDuplicatePayload(BaseModel):
     """Payload opcional para duplicar una rutina con un nombre personalizado."""
 
@@ -136,6 +188,36 @@ class EstadisticasResponse(BaseModel):
     top_rutinas: List[EstadisticaRutina]
     dias_mas_entrenados: List[EstadisticaDia]
 
+""" Volumen total (series × repeticiones × kg) de una rutina. """
+class VolumenRutina(BaseModel):
+    id: int
+    nombre: str
+    volumen: float
+
+""" Volumen total acumulado en un día de la semana. """
+class VolumenDia(BaseModel):
+    dia_semana: DiaSemana
+    volumen: float
+
+""" Volumen total acumulado por nombre de ejercicio. """
+class VolumenEjercicio(BaseModel):
+    nombre: str
+    volumen: float
+
+""" Respuesta de volumen de entrenamiento desglosado por rutina, día y ejercicio. """
+class VolumenResponse(BaseModel):
+    total: float
+    por_rutina: List[VolumenRutina]
+    por_dia: List[VolumenDia]
+    por_ejercicio: List[VolumenEjercicio]
+
+""" Carga de una semana del calendario (lunes de inicio) y su cambio respecto de la anterior. """
+class CargaSemanal(BaseModel):
+    semana: date
+    sesiones: int
+    volumen: float
+    cambio: Optional[float] = None
+
 """Define los campos comunes para crear o leer una planificación de rutina en una fecha."""
 class PlanificacionBase(BaseModel):
     fecha: date
@@ -159,3 +241,54 @@ class PlanificacionRead(PlanificacionBase):
         orm_mode = True
 
 
+
+"""Rutina sin ejercicios anidados, para respuestas de sincronización incremental."""
+class RutinaSyncRead(RutinaBase):
+    id: int
+    creado_en: datetime
+
+    class Config:
+        orm_mode = True
+
+"""Planificación sin la rutina anidada, para respuestas de sincronización incremental."""
+class PlanificacionSyncRead(PlanificacionBase):
+    id: int
+
+    class Config:
+        orm_mode = True
+
+"""Tombstone de una entidad borrada desde el último token."""
+class Eliminado(BaseModel):
+    entidad: str
+    id: int
+
+"""Respuesta de /api/sync: cambios desde el token recibido y el token para la próxima llamada."""
+class SyncResponse(BaseModel):
+    token: int
+    hay_mas: bool
+    rutinas: List[RutinaSyncRead]
+    ejercicios: List[EjercicioRead]
+    planificaciones: List[PlanificacionSyncRead]
+    eliminados: List[Eliminado]
+
+"""Sub-operación de un lote: método y ruta de un endpoint existente de la API."""
+class OperacionLote(BaseModel):
+    metodo: Literal["GET", "POST", "PUT", "DELETE"]
+    ruta: str = Field(..., min_length=1)
+    params: Optional[Dict[str, Any]] = None
+    body: Optional[Any] = None
+
+"""Payload de /api/batch: operaciones en orden; con atomico=True es todo o nada."""
+class LoteRequest(BaseModel):
+    operaciones: List[OperacionLote] = Field(..., min_items=1, max_items=50)
+    atomico: bool = False
+
+"""Status y cuerpo de cada sub-operación del lote."""
+class ResultadoOperacion(BaseModel):
+    status: int
+    body: Optional[Any] = None
+
+"""Respuesta de /api/batch; confirmado=False si un lote atómico se revirtió."""
+class LoteResponse(BaseModel):
+    confirmado: bool
+    resultados: List[ResultadoOperacion]
@@ -0,0 +1,235 @@
+import heapq
+import threading
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlmodel import Session as SesionSQLModel
+from sqlmodel import select
+
+from .models import Cambio, Ejercicio, Rutina
+from .sugerencias import normalizar
+
+"""
+Búsqueda de rutinas similares por conjunto de ejercicios (MinHash + LSH).
+
+Cada rutina se describe con un conjunto de rasgos (nombre de ejercicio, nombre+día y
+nombre+series×reps). Su firma MinHash de una sola permutación (un hash por rasgo,
+repartido en K cubetas) se corta en bandas; dos rutinas que coinciden en alguna
+banda son candidatas. Solo los candidatos se comparan con Jaccard exacto, así
+que la consulta no recorre todas las rutinas.
+"""
+
+CUBETAS = 32  # largo de la firma
+BANDAS = 8  # BANDAS × FILAS = CUBETAS; umbral aprox. (1/BANDAS)^(1/FILAS) ≈ 0.6
+FILAS = CUBETAS // BANDAS
+_MASCARA = (1 << 64) - 1
+_VACIA = _MASCARA
+
+
+def _rasgos(ejercicios: Iterable[Tuple]) -> FrozenSet[int]:
+    """Conjunto de rasgos (hasheados) a partir de (nombre, dia, series, repeticiones)."""
+    rasgos: Set[int] = set()
+    for nombre, dia, series, repeticiones in ejercicios:
+        clave = normalizar(nombre)
+        dia = getattr(dia, "value", dia)
+        rasgos.add(hash(clave) & _MASCARA)
+        rasgos.add(hash((clave, dia)) & _MASCARA)
+        rasgos.add(hash((clave, series, repeticiones)) & _MASCARA)
+    return frozenset(rasgos)
+
+
+def _firma(rasgos: FrozenSet[int]) -> Tuple[int, ...]:
+    """MinHash de una permutación con densificación por rotación para cubetas vacías."""
+    firma = [_VACIA] * CUBETAS
+    for h in rasgos:
+        cubeta, valor = h % CUBETAS, h // CUBETAS
+        if valor < firma[cubeta]:
+            firma[cubeta] = valor
+    if _VACIA in firma and any(v != _VACIA for v in firma):
+        llenas = list(firma)
+        for i in range(CUBETAS):
+            salto = 1
+            while llenas[i] == _VACIA:
+                vecino = firma[(i + salto) % CUBETAS]
+                if vecino != _VACIA:
+                    llenas[i] = vecino + salto * (_MASCARA // CUBETAS)
+                salto += 1
+        firma = llenas
+    return tuple(firma)
+
+
+class IndiceNoListo(Exception):
+    """Se lanza mientras el índice se construye en segundo plano."""
+
+
+def _bandas(firma: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(b, firma[b * FILAS : (b + 1) * FILAS]) for b in range(BANDAS)]
+
+
+class IndiceSimilares:
+    """
+    Índice en memoria. Se construye en un hilo aparte (al arrancar el worker o en
+    la primera consulta) y mientras tanto las consultas reciben IndiceNoListo.
+    Después se pone al día leyendo el registro de cambios (`cambios`) desde el
+    último token aplicado: solo se recalculan las rutinas tocadas, sin importar
+    qué worker escribió.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._construyendo = False
+        self._generacion = 0  # invalidar() descarta una construcción ya en curso
+        self._token: Optional[int] = None
+        self._rasgos: Dict[int, FrozenSet[int]] = {}
+        self._firmas: Dict[int, Tuple[int, ...]] = {}
+        self._cubos: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = defaultdict(set)
+        self._rutina_de: Dict[int, int] = {}  # ejercicio_id -> rutina_id
+        self._ejercicios_de: Dict[int, List[int]] = {}  # rutina_id -> ejercicio_ids
+
+    def invalidar(self) -> None:
+        """Fuerza la reconstrucción completa en la próxima consulta."""
+        with self._lock:
+            self._token = None
+            self._generacion += 1
+
+    def construir_en_segundo_plano(self, bind) -> None:
+        """Arranca la construcción en un hilo (no hace nada si ya hay una en curso o está listo)."""
+        with self._lock:
+            if self._construyendo or self._token is not None:
+                return
+            self._construyendo = True
+            generacion = self._generacion
+        threading.Thread(
+            target=self._construir_y_publicar, args=(bind, generacion), name="similares-indice", daemon=True
+        ).start()
+
+    def _construir_y_publicar(self, bind, generacion: int) -> None:
+        nuevo = IndiceSimilares()
+        try:
+            with SesionSQLModel(bind) as session:
+                nuevo._construir(session)
+        except Exception as exc:
+            print(f"⚠ No se pudo construir el índice de similares: {exc}")
+            nuevo = None
+        with self._lock:
+            self._construyendo = False
+            if nuevo is None or generacion != self._generacion:
+                return
+            # Se reemplaza todo de una vez: las consultas ven el índice viejo o el nuevo
+            self._token, self._rasgos, self._firmas = nuevo._token, nuevo._rasgos, nuevo._firmas
+            self._cubos, self._rutina_de = nuevo._cubos, nuevo._rutina_de
+            self._ejercicios_de = nuevo._ejercicios_de
+
+    def _quitar(self, rutina_id: int) -> None:
+        for ej_id in self._ejercicios_de.pop(rutina_id, ()):
+            self._rutina_de.pop(ej_id, None)
+        firma = self._firmas.pop(rutina_id, None)
+        self._rasgos.pop(rutina_id, None)
+        if firma is not None:
+            for banda in _bandas(firma):
+                cubo = self._cubos.get(banda)
+                if cubo is not None:
+                    cubo.discard(rutina_id)
+                    if not cubo:
+                        del self._cubos[banda]
+
+    def _cargar(self, session: Session, rutina_ids: Optional[Set[int]]) -> None:
+        """(Re)indexa las rutinas dadas (todas si es None) leyendo sus ejercicios."""
+        stmt = select(
+            Ejercicio.id,
+            Ejercicio.rutina_id,
+            Ejercicio.nombre,
+            Ejercicio.dia_semana,
+            Ejercicio.series,
+            Ejercicio.repeticiones,
+        )
+        if rutina_ids is not None:
+            if not rutina_ids:
+                return
+            stmt = stmt.where(Ejercicio.rutina_id.in_(rutina_ids))
+            for rutina_id in rutina_ids:
+                self._quitar(rutina_id)
+        por_rutina: Dict[int, List[Tuple]] = defaultdict(list)
+        for ej_id, rutina_id, nombre, dia, series, repeticiones in session.exec(stmt):
+            self._rutina_de[ej_id] = rutina_id
+            self._ejercicios_de.setdefault(rutina_id, []).append(ej_id)
+            por_rutina[rutina_id].append((nombre, dia, series, repeticiones))
+        for rutina_id, ejercicios in por_rutina.items():
+            rasgos = _rasgos(ejercicios)
+            firma = _firma(rasgos)
+            self._rasgos[rutina_id] = rasgos
+            self._firmas[rutina_id] = firma
+            for banda in _bandas(firma):
+                self._cubos[banda].add(rutina_id)
+
+    def _construir(self, session: Session) -> None:
+        self._token = session.exec(select(func.coalesce(func.max(Cambio.id), 0))).one()
+        self._rasgos, self._firmas, self._rutina_de, self._ejercicios_de = {}, {}, {}, {}
+        self._cubos = defaultdict(set)
+        self._cargar(session, None)
+
+    def _poner_al_dia(self, session: Session) -> None:
+        cambios = session.exec(
+            select(Cambio.id, Cambio.entidad, Cambio.entidad_id, Cambio.operacion)
+            .where(Cambio.id > self._token, Cambio.entidad.in_(("rutina", "ejercicio")))
+            .order_by(Cambio.id)
+        ).all()
+        if not cambios:
+            return
+        afectadas: Set[int] = set()
+        ejercicios_modificados: Set[int] = set()
+        for _, entidad, entidad_id, operacion in cambios:
+            if entidad == "rutina":
+                afectadas.add(entidad_id)
+            else:
+                if entidad_id in self._rutina_de:
+                    afectadas.add(self._rutina_de[entidad_id])
+                if operacion == "upsert":
+                    ejercicios_modificados.add(entidad_id)
+        if ejercicios_modificados:
+            afectadas.update(
+                session.exec(
+                    select(Ejercicio.rutina_id).where(Ejercicio.id.in_(ejercicios_modificados))
+                ).all()
+            )
+        self._cargar(session, afectadas)
+        self._token = cambios[-1].id
+
+    def similares(self, session: Session, rutina_id: int, limit: int = 10) -> List[dict]:
+        """Rutinas más parecidas a `rutina_id` con su similitud de Jaccard (0..1)."""
+        if self._token is None:
+            self.construir_en_segundo_plano(session.get_bind())
+            raise IndiceNoListo
+        with self._lock:
+            if self._token is None:
+                raise IndiceNoListo  # se invalidó entre medio
+            self._poner_al_dia(session)
+            rasgos = self._rasgos.get(rutina_id)
+            if not rasgos:
+                return []
+            candidatas: Set[int] = set()
+            for banda in _bandas(self._firmas[rutina_id]):
+                candidatas.update(self._cubos.get(banda, ()))
+            candidatas.discard(rutina_id)
+            puntajes = []
+            for otra in candidatas:
+                otros = self._rasgos[otra]
+                puntajes.append((len(rasgos & otros) / len(rasgos | otros), otra))
+            mejores = heapq.nlargest(limit, puntajes)
+
+        if not mejores:
+            return []
+        nombres = dict(
+            session.exec(select(Rutina.id, Rutina.nombre).where(Rutina.id.in_([r for _, r in mejores]))).all()
+        )
+        return [
+            {"id": r, "nombre": nombres[r], "similitud": round(similitud, 4)}
+            for similitud, r in mejores
+            if r in nombres
+        ]
+
+
+indice = IndiceSimilares()
@@ -0,0 +1,312 @@
+import heapq
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from itertools import islice
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from .models import Cambio, Ejercicio
+
+""" Autocompletado de nombres de ejercicio con un índice de prefijos en memoria """
+
+# Largo máximo de una lista de sugerencias (tope de `limit` en la ruta)
+LIMITE_MAXIMO = 50
+# Claves guardadas por top: la holgura absorbe bajas sin tener que recalcularlo
+TOP_GUARDADO = 2 * LIMITE_MAXIMO
+# Los prefijos de hasta este largo tienen su top precalculado al construir el índice
+PREFIJO_PRECALCULADO = 3
+# Tops de prefijos más largos calculados al consultarse (LRU aparte de los precalculados)
+MAX_CACHEADOS = 10_000
+# Variantes a una edición que se buscan como máximo por consulta
+MAX_SONDEOS = 200
+# El registro de cambios se relee como mucho una vez por este intervalo: la consulta
+# no paga un SELECT por tecla y las escrituras (de cualquier worker) se ven en ~1 s
+ACTUALIZAR_CADA = 1.0
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin acentos y con espacios colapsados ("Press  Banca" -> "press banca")."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_acentos.casefold().split())
+
+
+class IndiceEjercicios:
+    """
+    Arreglos ordenados de nombres normalizados (y de cada palabra del nombre) con
+    su frecuencia. Un prefijo se resuelve con bisect en O(log n) y el ranking solo
+    mira el rango que coincide. Se construye la primera vez que se consulta y
+    después se pone al día leyendo el registro de cambios (`cambios`), como el
+    índice de similares: ve las escrituras de cualquier worker sin reconstruirse
+    (con hasta ACTUALIZAR_CADA segundos de demora).
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._token: Optional[int] = None
+        self._leido_en = 0.0  # time.monotonic() de la última lectura de `cambios`
+        self._clave_de: Dict[int, str] = {}  # ejercicio_id -> clave normalizada
+        self._nombres: List[str] = []  # claves normalizadas, ordenadas
+        self._palabras: List[Tuple[str, str]] = []  # (palabra, clave), ordenadas
+        self._frecuencia: Counter = Counter()
+        self._visible: Dict[str, str] = {}  # clave -> nombre tal como se escribió
+        # (sobre palabras?, prefijo) -> comienzo del ranking por (-frecuencia, clave)
+        self._top: Dict[Tuple[bool, str], List[str]] = {}  # precalculados (prefijos cortos)
+        self._cache: "OrderedDict[Tuple[bool, str], List[str]]" = OrderedDict()  # a demanda
+        self._truncados: Set[Tuple[bool, str]] = set()  # tops con más claves fuera de la lista
+
+    def invalidar(self) -> None:
+        """Fuerza la reconstrucción en la próxima consulta."""
+        with self._lock:
+            self._token = None
+
+    def _construir(self, session: Session) -> None:
+        self._token = session.exec(select(func.coalesce(func.max(Cambio.id), 0))).one()
+        frecuencia: Counter = Counter()
+        visible: Dict[str, str] = {}
+        clave_de: Dict[int, str] = {}
+        claves: Dict[str, str] = {}  # nombre -> clave, para normalizar cada nombre una vez
+        for ej_id, nombre in session.exec(select(Ejercicio.id, Ejercicio.nombre)):
+            clave = claves.get(nombre)
+            if clave is None:
+                clave = claves[nombre] = normalizar(nombre)
+                visible.setdefault(clave, nombre)
+            clave_de[ej_id] = clave
+            frecuencia[clave] += 1
+        self._clave_de = clave_de
+        self._frecuencia = frecuencia
+        self._visible = visible
+        self._nombres = sorted(frecuencia)
+        self._palabras = sorted((p, clave) for clave in frecuencia for p in set(clave.split()))
+        # Top de los prefijos cortos (los de rango más grande): recorriendo las claves de
+        # más a menos frecuente, cada prefijo se queda con las primeras TOP_GUARDADO
+        top: Dict[Tuple[bool, str], List[str]] = {}
+        truncados: Set[Tuple[bool, str]] = set()
+        for clave in sorted(frecuencia, key=self._orden):
+            for prefijo in self._prefijos(clave, PREFIJO_PRECALCULADO):
+                lista = top.setdefault(prefijo, [])
+                if len(lista) < TOP_GUARDADO:
+                    lista.append(clave)
+                else:
+                    truncados.add(prefijo)
+        self._top = top
+        self._cache = OrderedDict()
+        self._truncados = truncados
+
+    def _poner_al_dia(self, session: Session) -> None:
+        """Aplica los ejercicios tocados desde el último token (nombre anterior -> actual)."""
+        self._leido_en = time.monotonic()
+        cambios = session.exec(
+            select(Cambio.id, Cambio.entidad_id)
+            .where(Cambio.id > self._token, Cambio.entidad == "ejercicio")
+            .order_by(Cambio.id)
+        ).all()
+        if not cambios:
+            return
+        ids = {entidad_id for _, entidad_id in cambios}
+        actuales = dict(session.exec(select(Ejercicio.id, Ejercicio.nombre).where(Ejercicio.id.in_(ids))).all())
+        altas, bajas = [], []
+        for ej_id in ids:
+            # Se compara contra el estado actual, así que repetir un cambio no lo cuenta dos veces
+            anterior, nombre = self._clave_de.pop(ej_id, None), actuales.get(ej_id)
+            clave = normalizar(nombre) if nombre is not None else None
+            if clave is not None:
+                self._clave_de[ej_id] = clave
+            if anterior != clave:
+                if anterior is not None:
+                    bajas.append(anterior)
+                if nombre is not None:
+                    altas.append(nombre)
+        self._aplicar(altas, bajas)
+        self._token = cambios[-1].id
+
+    @staticmethod
+    def _prefijos(clave: str, maximo: Optional[int] = None) -> Set[Tuple[bool, str]]:
+        """Prefijos (del nombre y de cada palabra) bajo los que aparece `clave`."""
+        prefijos = {(False, clave[:largo]) for largo in range(1, min(len(clave), maximo or len(clave)) + 1)}
+        for palabra in clave.split():
+            tope = min(len(palabra), maximo or len(palabra))
+            prefijos.update((True, palabra[:largo]) for largo in range(1, tope + 1))
+        return prefijos
+
+    def _orden(self, clave: str) -> Tuple[int, str]:
+        return (-self._frecuencia[clave], clave)
+
+    def _actualizar_top(self, clave: str) -> None:
+        """
+        Reubica `clave` en los tops guardados de sus prefijos tras cambiar su frecuencia.
+        Cada top es el comienzo exacto del ranking de su prefijo: uno truncado solo
+        acepta claves que quedan antes de su último elemento y, si una baja lo deja con
+        menos de LIMITE_MAXIMO, se descarta para recalcularlo en la próxima consulta.
+        """
+        for prefijo in self._prefijos(clave):
+            guardados = self._top if prefijo in self._top else self._cache
+            lista = guardados.get(prefijo)
+            if lista is None:
+                continue
+            if clave in lista:
+                lista.remove(clave)
+            truncado = prefijo in self._truncados
+            if self._frecuencia[clave] > 0 and (
+                not truncado or (lista and self._orden(clave) < self._orden(lista[-1]))
+            ):
+                insort(lista, clave, key=self._orden)
+                if len(lista) > TOP_GUARDADO:
+                    del lista[TOP_GUARDADO:]
+                    self._truncados.add(prefijo)
+            if prefijo in self._truncados and len(lista) < LIMITE_MAXIMO:
+                del guardados[prefijo]
+                self._truncados.discard(prefijo)
+
+    def _aplicar(self, altas: Iterable[str], bajas: Iterable[str]) -> None:
+        """Actualiza el índice con nombres (o claves) dados de alta/baja, sin releer la tabla."""
+        for nombre in altas:
+            clave = normalizar(nombre)
+            if self._frecuencia[clave] == 0:
+                insort(self._nombres, clave)
+                for p in set(clave.split()):
+                    insort(self._palabras, (p, clave))
+                self._visible[clave] = nombre
+            self._frecuencia[clave] += 1
+            self._actualizar_top(clave)
+        for nombre in bajas:
+            clave = normalizar(nombre)
+            if self._frecuencia[clave] <= 0:
+                continue
+            self._frecuencia[clave] -= 1
+            if self._frecuencia[clave] == 0:
+                del self._frecuencia[clave]
+                del self._visible[clave]
+                del self._nombres[bisect_left(self._nombres, clave)]
+                for p in set(clave.split()):
+                    del self._palabras[bisect_left(self._palabras, (p, clave))]
+            self._actualizar_top(clave)
+
+    def _inicio(self, arreglo: List, prefijo: str) -> int:
+        return bisect_left(arreglo, (prefijo,) if arreglo is self._palabras else prefijo)
+
+    def _fin(self, arreglo: List, prefijo: str) -> int:
+        tope = prefijo + "\uffff"
+        return bisect_left(arreglo, (tope,) if arreglo is self._palabras else tope)
+
+    def _top_prefijo(self, arreglo: List, q: str, n: int) -> List[str]:
+        """Las n claves más frecuentes cuyo nombre (o alguna palabra) empieza por q."""
+        sobre_palabras = arreglo is self._palabras
+        clave_cache = (sobre_palabras, q)
+        if clave_cache in self._top:
+            return self._top[clave_cache][:n]
+        if clave_cache in self._cache:
+            self._cache.move_to_end(clave_cache)
+            return self._cache[clave_cache][:n]
+
+        # El top guardado de un prefijo más corto es el comienzo exacto de su ranking: las
+        # claves que además empiezan por q son el comienzo del ranking de q
+        for largo in range(len(q) - 1, 0, -1):
+            ancestro = (sobre_palabras, q[:largo])
+            lista = self._top.get(ancestro) or self._cache.get(ancestro)
+            if lista is None:
+                continue
+            if sobre_palabras:
+                coinciden = [c for c in lista if any(p.startswith(q) for p in c.split())]
+            else:
+                coinciden = [c for c in lista if c.startswith(q)]
+            if len(coinciden) >= n or ancestro not in self._truncados:
+                return coinciden[:n]
+            break
+
+        inicio, fin = self._inicio(arreglo, q), self._fin(arreglo, q)
+        rango = arreglo[inicio:fin]
+        if sobre_palabras:
+            rango = {c for _, c in rango}
+        mejores = heapq.nsmallest(TOP_GUARDADO, rango, key=self._orden)
+        if len(q) <= PREFIJO_PRECALCULADO:
+            self._top[clave_cache] = mejores  # uno precalculado que se descartó tras una baja
+        else:
+            self._cache[clave_cache] = mejores
+            if len(self._cache) > MAX_CACHEADOS:
+                viejo, _ = self._cache.popitem(last=False)
+                self._truncados.discard(viejo)
+        if len(rango) > TOP_GUARDADO:
+            self._truncados.add(clave_cache)
+        return mejores[:n]
+
+    def _siguientes(self, prefijo: str) -> Iterable[str]:
+        """Caracteres que siguen a `prefijo` en algún nombre (saltos con bisect, como un trie)."""
+        nombres = self._nombres
+        largo = len(prefijo)
+        i = bisect_left(nombres, prefijo)
+        while i < len(nombres) and nombres[i].startswith(prefijo):
+            if len(nombres[i]) == largo:
+                i += 1
+                continue
+            c = nombres[i][largo]
+            yield c
+            i = bisect_left(nombres, prefijo + chr(ord(c) + 1), i)
+
+    def _variantes(self, cabeza: str, q: str) -> Iterable[str]:
+        """
+        Textos a una edición de q (la última palabra, tras `cabeza`). La primera letra se
+        respeta. Sustituciones e inserciones solo prueban caracteres que el índice tiene
+        después de ese prefijo, así que no se sondean ramas vacías.
+        """
+        for i in range(1, len(q)):
+            yield q[:i] + q[i + 1 :]
+            if i + 1 < len(q):
+                yield q[:i] + q[i + 1] + q[i] + q[i + 2 :]
+        for i in range(1, len(q) + 1):
+            hay_rama = False
+            for c in self._siguientes(cabeza + q[:i]):
+                hay_rama = True
+                if i < len(q) and c != q[i]:
+                    yield q[:i] + c + q[i + 1 :]
+                yield q[:i] + c + q[i:]
+            if not hay_rama:
+                break  # ningún nombre empieza por q[:i]: tampoco por algo más largo
+
+    def sugerir(self, session: Session, q: str, limit: int = 10) -> List[dict]:
+        """Prefijo del nombre, luego prefijo de alguna palabra y por último a una edición."""
+        with self._lock:
+            if self._token is None:
+                self._construir(session)
+                self._leido_en = time.monotonic()
+            elif time.monotonic() - self._leido_en >= ACTUALIZAR_CADA:
+                self._poner_al_dia(session)
+            q = normalizar(q)
+            if not q:
+                return []
+            claves = list(self._top_prefijo(self._nombres, q, limit))
+
+            if len(claves) < limit:
+                vistos = set(claves)
+                extra = self._top_prefijo(self._palabras, q, limit + len(claves))
+                claves.extend([c for c in extra if c not in vistos][: limit - len(claves)])
+
+            if len(claves) < limit and len(q) >= 3:
+                # Tolerancia a un error de tipeo en la palabra que se está escribiendo:
+                # cada variante se busca como prefijo y solo se miran sus primeras coincidencias
+                vistos = set(claves)
+                extra = set()
+                nombres = self._nombres
+                total = len(nombres)
+                cabeza, _, ultima = q.rpartition(" ")
+                cabeza = f"{cabeza} " if cabeza else ""
+                for variante in islice(self._variantes(cabeza, ultima), MAX_SONDEOS):
+                    variante = cabeza + variante
+                    i = bisect_left(nombres, variante)
+                    fin = min(i + limit, total)
+                    while i < fin and nombres[i].startswith(variante):
+                        extra.add(nombres[i])
+                        i += 1
+                extra -= vistos
+                claves.extend(heapq.nsmallest(limit - len(claves), extra, key=self._orden))
+
+            return [{"nombre": self._visible[c], "frecuencia": self._frecuencia[c]} for c in claves]
+
+
+indice = IndiceEjercicios()
@@ -0,0 +1,77 @@
+"""
+Benchmark de arranque del backend: tiempo de importar `app.main` y tiempo hasta
+la primera respuesta de un worker uvicorn recién lanzado, tanto de /health (no toca
+la base) como del primer request que sí la usa (GET /api/rutinas?limit=1).
+
+Uso (desde backend/):
+    python bench_arranque.py --repeticiones 5
+    LEAN_STARTUP=1 python bench_arranque.py
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Tuple
+
+PUERTO = 8799
+
+
+def medir_import() -> float:
+    """Segundos que tarda un intérprete nuevo en importar app.main."""
+    codigo = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], capture_output=True, text=True, check=True
+    ).stdout
+    return float(salida.strip().splitlines()[-1])
+
+
+def medir_primera_respuesta(timeout: float = 30.0) -> Tuple[float, float]:
+    """
+    Segundos desde lanzar uvicorn hasta que GET /health responde 200 y hasta que
+    responde el primer request con base de datos (conexión, pool y consulta incluidos).
+    """
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PUERTO)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - inicio < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{PUERTO}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        health = time.perf_counter() - inicio
+                        break
+            except OSError:
+                time.sleep(0.01)
+        else:
+            raise TimeoutError("el servidor no respondió a tiempo")
+        with urllib.request.urlopen(f"http://127.0.0.1:{PUERTO}/api/rutinas?limit=1", timeout=timeout) as resp:
+            resp.read()
+            if resp.status != 200:
+                raise RuntimeError(f"GET /api/rutinas respondió {resp.status}")
+        return health, time.perf_counter() - inicio
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = [medir_import() for _ in range(args.repeticiones)]
+    primeras = [medir_primera_respuesta() for _ in range(args.repeticiones)]
+    print(f"LEAN_STARTUP={os.getenv('LEAN_STARTUP', '0')}  ({args.repeticiones} repeticiones, mediana)")
+    print(f"  import app.main:        {statistics.median(imports) * 1000:8.1f} ms")
+    print(f"  hasta primera respuesta: {statistics.median(p[0] for p in primeras) * 1000:8.1f} ms  (/health)")
+    print(f"  hasta primera consulta:  {statistics.median(p[1] for p in primeras) * 1000:8.1f} ms  (/api/rutinas)")
+
+
+if __name__ == "__main__":
+    main()
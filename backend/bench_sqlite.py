@@ -0,0 +1,116 @@
+"""
+Comparación de throughput del backend sobre SQLite: perfil ajustado (WAL, pragmas y
+cola de escritura) contra la configuración por defecto (SQLITE_AJUSTADO=0: pysqlite
+con su manejo de transacciones de siempre, sin pragmas ni cola).
+
+Levanta un worker uvicorn por perfil sobre una base nueva y lo carga con clientes
+concurrentes que mezclan lecturas (GET /api/rutinas) y escrituras (POST /api/rutinas).
+
+Uso (desde backend/):
+    python bench_sqlite.py --segundos 10 --clientes 16
+    python bench_sqlite.py --segundos 10 --clientes 80   # más clientes que hilos del threadpool (40)
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+PUERTO = 8798
+
+
+def _pedir(metodo: str, ruta: str, cuerpo=None) -> int:
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{PUERTO}{ruta}",
+        data=datos,
+        method=metodo,
+        headers={"content-type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+
+
+def correr(ajustado: bool, segundos: float, clientes: int, escrituras: float) -> dict:
+    carpeta = tempfile.mkdtemp(prefix="bench_sqlite_")
+    entorno = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{carpeta}/rutinas.db",
+        SQLITE_AJUSTADO="1" if ajustado else "0",
+        IDEMPOTENCIA_DB=f"{carpeta}/idempotencia.sqlite3",
+    )
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PUERTO)],
+        env=entorno,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(300):
+            try:
+                if _pedir("GET", "/health") == 200:
+                    break
+            except OSError:
+                time.sleep(0.05)
+        ok = errores = 0
+        contador = iter(range(10**9))
+        lock = threading.Lock()
+        fin = time.perf_counter() + segundos
+
+        def cliente() -> None:
+            nonlocal ok, errores
+            while time.perf_counter() < fin:
+                if random.random() < escrituras:
+                    status = _pedir(
+                        "POST",
+                        "/api/rutinas",
+                        {
+                            "nombre": f"Rutina {next(contador)}",
+                            "ejercicios": [
+                                {"nombre": "Remo", "dia_semana": "Lunes", "series": 3, "repeticiones": 10, "peso": 40}
+                            ],
+                        },
+                    )
+                else:
+                    status = _pedir("GET", "/api/rutinas?limit=10")
+                with lock:
+                    if status < 400:
+                        ok += 1
+                    else:
+                        errores += 1
+
+        hilos = [threading.Thread(target=cliente) for _ in range(clientes)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return {"ok": ok, "errores": errores, "req_s": ok / segundos}
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--escrituras", type=float, default=0.3, help="fracción de requests que escriben")
+    args = parser.parse_args()
+
+    for nombre, ajustado in (("por defecto", False), ("ajustado", True)):
+        r = correr(ajustado, args.segundos, args.clientes, args.escrituras)
+        print(f"{nombre:12} {r['req_s']:8.1f} req/s   ok={r['ok']}  errores={r['errores']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Latencia del autocompletado (GET /api/ejercicios/sugerencias) con muchos nombres distintos.
+
+Arma una base SQLite nueva con `--nombres` nombres de ejercicio sintéticos, construye
+el índice y mide cada consulta en frío (primera vez) y en caliente: prefijos cortos
+y largos, palabras y consultas con un error de tipeo. Compara los resultados con un
+ranking por fuerza bruta y termina con código 1 si el p95 supera `--objetivo-ms`.
+
+Uso (desde backend/):
+    python bench_sugerencias.py --nombres 100000 --objetivo-ms 1
+"""
+import argparse
+import heapq
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+CONSULTAS = [
+    "p", "s", "b", "pr", "se", "pre", "pres", "sen", "sentadill", "presenta", "curl",
+    "ban", "banca ex", "tension", "bance", "prexsenta", "sentadillaxz", "pretadilla", "zzzz",
+]  # fmt: skip
+SILABAS = ["pre", "sen", "ta", "di", "lla", "re", "mo", "cur", "l", "ban", "ca", "ex", "ten", "sion", "pul"]
+
+
+def _poblar(ruta: str, cantidad: int) -> None:
+    random.seed(7)
+    nombres = set()
+    while len(nombres) < cantidad:
+        palabra = lambda: "".join(random.choice(SILABAS) for _ in range(random.randint(2, 4)))  # noqa: E731
+        nombres.add(" ".join(palabra() for _ in range(random.randint(1, 3))).capitalize())
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("INSERT INTO rutinas (id, nombre, creado_en) VALUES (1, 'Bench', '2026-01-01')")
+    conexion.executemany(
+        "INSERT INTO ejercicios (rutina_id, nombre, dia_semana, series, repeticiones, orden) "
+        "VALUES (1, ?, 'lunes', 3, 10, 0)",
+        [(n,) for n in nombres for _ in range(random.choice((1, 1, 1, 2, 5)))],
+    )
+    conexion.commit()
+    conexion.close()
+
+
+def _ms(funcion) -> float:
+    inicio = time.perf_counter()
+    funcion()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nombres", type=int, default=100_000)
+    parser.add_argument("--objetivo-ms", type=float, default=1.0, help="p95 máximo aceptado por consulta")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_sugerencias_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{carpeta}/rutinas.db"
+    from sqlmodel import Session
+
+    from app.database import engine, init_db
+    from app.sugerencias import indice, normalizar
+
+    init_db()
+    _poblar(f"{carpeta}/rutinas.db", args.nombres)
+
+    with Session(engine) as session:
+        print(f"construcción: {_ms(lambda: indice.sugerir(session, 'x')):.0f} ms")
+        frias = {q: _ms(lambda: indice.sugerir(session, q)) for q in CONSULTAS}
+        calientes = {q: statistics.median(_ms(lambda: indice.sugerir(session, q)) for _ in range(20)) for q in CONSULTAS}
+        for q in CONSULTAS:
+            print(f"{q!r:16} frío {frias[q]:7.3f} ms   caliente {calientes[q]:7.3f} ms")
+
+        for q in ("p", "pre", "pres", "sen", "curl"):
+            esperado = heapq.nsmallest(
+                10, (c for c in indice._nombres if c.startswith(q)), key=indice._orden
+            )
+            obtenido = [normalizar(s["nombre"]) for s in indice.sugerir(session, q)][: len(esperado)]
+            assert obtenido == esperado, f"ranking distinto para {q!r}"
+
+    tiempos = sorted([*frias.values(), *calientes.values()])
+    p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+    print(f"p95 {p95:.3f} ms (objetivo {args.objetivo_ms} ms)")
+    sys.exit(0 if p95 <= args.objetivo_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
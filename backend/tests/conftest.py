@@ -0,0 +1,52 @@
+import os
+import tempfile
+import threading
+
+import pytest
+
+# La app arma el engine al importarse: la base de prueba se fija antes de importarla
+_DIRECTORIO = tempfile.mkdtemp(prefix="rutinas-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DIRECTORIO}/rutinas.db"
+os.environ["IDEMPOTENCIA_DB"] = f"{_DIRECTORIO}/idempotencia.sqlite3"
+os.environ.setdefault("SQLITE_AJUSTADO", "1")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from app import similares, sugerencias  # noqa: E402
+from app.database import engine, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+
+""" Fixtures comunes: base SQLite temporal (perfil ajustado) y cliente HTTP """
+
+HILOS_DE_FONDO = {"eventos-sondeo", "similares-indice"}
+
+
+@pytest.fixture
+def client():
+    SQLModel.metadata.drop_all(engine)
+    init_db()
+    sugerencias.indice.invalidar()
+    similares.indice.invalidar()
+    with TestClient(app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def sentencias():
+    """Lista con el SQL que ejecuta el engine mientras dura el test."""
+    ejecutadas = []
+
+    def anotar(conn, cursor, statement, parameters, context, executemany) -> None:
+        # El sondeo del feed y el armado del índice de similares corren en sus propios hilos
+        if threading.current_thread().name not in HILOS_DE_FONDO:
+            ejecutadas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", anotar)
+    yield ejecutadas
+    event.remove(engine, "before_cursor_execute", anotar)
+
+
+def ejercicio(nombre: str, dia: str = "Lunes", series: int = 3, repeticiones: int = 10) -> dict:
+    return {"nombre": nombre, "dia_semana": dia, "series": series, "repeticiones": repeticiones}
@@ -0,0 +1,44 @@
+from sqlalchemy import text
+
+from app.database import engine
+from conftest import ejercicio
+
+""" Estadísticas de volumen y carga semanal """
+
+
+def _rutina(client, nombre, peso):
+    ej = {**ejercicio("Sentadilla"), "peso": peso}
+    return client.post("/api/rutinas", json={"nombre": nombre, "ejercicios": [ej]}).json()["id"]
+
+
+def test_cambio_contra_la_semana_calendario_anterior(client):
+    liviana, pesada = _rutina(client, "Liviana", 10), _rutina(client, "Pesada", 20)
+    for fecha, rutina in (("2026-01-05", liviana), ("2026-01-12", pesada), ("2026-01-26", liviana)):
+        client.post("/api/planificaciones", json={"fecha": fecha, "rutina_id": rutina})
+
+    semanas = client.get("/api/estadisticas/carga-semanal").json()
+
+    assert [(s["semana"], s["volumen"], s["cambio"]) for s in semanas] == [
+        ("2026-01-05", 300.0, None),
+        ("2026-01-12", 600.0, 300.0),
+        # La semana del 19 no tuvo sesiones: el cambio es contra 0, no contra la del 12
+        ("2026-01-26", 300.0, 300.0),
+    ]
+
+
+def test_cache_ve_escrituras_de_otro_proceso(client):
+    rutina = _rutina(client, "A", 10)
+    assert client.get("/api/estadisticas/volumen").json()["total"] == 300.0
+
+    # Otro worker escribe directo en la base (sin pasar por este proceso)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO ejercicios (rutina_id, nombre, dia_semana, series, repeticiones, peso, orden) "
+                "VALUES (:rutina, 'Remo', 'martes', 1, 1, 5, 1)"
+            ),
+            {"rutina": rutina},
+        )
+        conn.execute(text("INSERT INTO cambios (entidad, entidad_id, operacion) VALUES ('ejercicio', 2, 'upsert')"))
+
+    assert client.get("/api/estadisticas/volumen").json()["total"] == 305.0
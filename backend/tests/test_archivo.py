@@ -0,0 +1,68 @@
+from sqlmodel import Session
+
+from app import particiones
+from app.database import engine
+from conftest import ejercicio
+
+""" Calendario archivado: lectura por rango y fechas de solo lectura """
+
+
+def test_fecha_archivada_no_se_vuelve_a_planificar(client):
+    rutina = client.post("/api/rutinas", json={"nombre": "Base"}).json()
+    plan = client.post("/api/planificaciones", json={"fecha": "2019-03-04", "rutina_id": rutina["id"]}).json()
+    with Session(engine) as session:
+        assert particiones.archivar(session, antes_de_anio=2020) == {2019: 1}
+
+    rango = {"desde": "2019-01-01", "hasta": "2019-12-31"}
+    archivadas = client.get("/api/planificaciones", params=rango).json()
+    assert [(p["id"], p["fecha"]) for p in archivadas] == [(plan["id"], "2019-03-04")]
+
+    otra = client.post("/api/planificaciones", json={"fecha": "2019-03-04", "rutina_id": rutina["id"]})
+    assert otra.status_code == 409
+    libre = client.post("/api/planificaciones", json={"fecha": "2019-03-05", "rutina_id": rutina["id"]})
+    assert libre.status_code == 201
+    movida = client.put(f"/api/planificaciones/{libre.json()['id']}", json={"fecha": "2019-03-04"})
+    assert movida.status_code == 409
+    assert [p["fecha"] for p in client.get("/api/planificaciones", params=rango).json()] == [
+        "2019-03-04",
+        "2019-03-05",
+    ]
+
+
+def test_rutinas_del_archivo_no_se_borran_y_se_reasignan(client):
+    vieja = client.post("/api/rutinas", json={"nombre": "Vieja"}).json()
+    nueva = client.post("/api/rutinas", json={"nombre": "Nueva"}).json()
+    client.post("/api/planificaciones", json={"fecha": "2019-06-10", "rutina_id": vieja["id"]})
+    with Session(engine) as session:
+        particiones.archivar(session, antes_de_anio=2020)
+
+    # Solo el archivo la referencia: borrarla dejaría el historial con rutina null
+    assert client.delete(f"/api/rutinas/{vieja['id']}").status_code == 409
+    sin_destino = client.post("/api/rutinas/eliminar", json={"nombre": "Vieja"})
+    assert sin_destino.status_code == 409
+
+    conteo = client.post("/api/rutinas/eliminar", json={"nombre": "Vieja", "dry_run": True}).json()
+    assert conteo["planificaciones"] == 1
+    borrado = client.post("/api/rutinas/eliminar", json={"nombre": "Vieja", "reasignar_a": nueva["id"]}).json()
+    assert (borrado["rutinas"], borrado["planificaciones"]) == (1, 1)
+
+    rango = {"desde": "2019-01-01", "hasta": "2019-12-31"}
+    [plan] = client.get("/api/planificaciones", params=rango).json()
+    assert plan["rutina_id"] == nueva["id"] and plan["rutina"]["nombre"] == "Nueva"
+
+
+def test_archivar_deja_tombstones_y_conserva_la_carga_semanal(client):
+    ejercicios = [{**ejercicio("Sentadilla"), "peso": 20}]
+    rutina_id = client.post("/api/rutinas", json={"nombre": "Pesada", "ejercicios": ejercicios}).json()["id"]
+    plan = client.post("/api/planificaciones", json={"fecha": "2019-03-06", "rutina_id": rutina_id}).json()
+    rango = {"desde": "2019-01-01", "hasta": "2019-12-31"}
+    antes = client.get("/api/estadisticas/carga-semanal", params=rango).json()
+    token = client.get("/api/sync", params={"solo_token": True}).json()["token"]
+
+    with Session(engine) as session:
+        particiones.archivar(session, antes_de_anio=2020)
+
+    delta = client.get("/api/sync", params={"since": token}).json()
+    assert delta["eliminados"] == [{"entidad": "planificacion", "id": plan["id"]}]
+    assert antes == [{"semana": "2019-03-04", "sesiones": 1, "volumen": 600.0, "cambio": None}]
+    assert client.get("/api/estadisticas/carga-semanal", params=rango).json() == antes
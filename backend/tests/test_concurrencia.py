@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import httpx
+
+from app.main import app
+from conftest import ejercicio
+
+""" Flujos de la API con el perfil SQLite ajustado y más escritores que hilos del threadpool """
+
+# El threadpool de AnyIO tiene 40 hilos: la cola de escritura no debe ocupar uno por request en espera
+ESCRITORES = 80
+
+
+async def _enviar(pedidos):
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+        return await asyncio.gather(*(pedido(cliente) for pedido in pedidos))
+
+
+def _en_paralelo(pedidos):
+    """Manda los pedidos a la vez; si el worker se traba el test falla en vez de colgarse."""
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.update(respuestas=asyncio.run(_enviar(pedidos))), daemon=True)
+    hilo.start()
+    hilo.join(60)
+    assert not hilo.is_alive(), "las escrituras concurrentes quedaron bloqueadas"
+    return resultado["respuestas"]
+
+
+def test_escritores_concurrentes_no_bloquean_el_worker(client):
+    def crear(i):
+        return lambda cliente: cliente.post(
+            "/api/rutinas", json={"nombre": f"Rutina {i}", "ejercicios": [ejercicio(f"Press {i}")]}
+        )
+
+    def leer(cliente):
+        return cliente.get("/api/rutinas", params={"limit": 5})
+
+    respuestas = _en_paralelo([crear(i) for i in range(ESCRITORES)] + [leer] * 20)
+    assert [r.status_code for r in respuestas[:ESCRITORES]] == [201] * ESCRITORES
+    assert all(r.status_code == 200 for r in respuestas[ESCRITORES:])
+    assert client.get("/api/rutinas").json()["total"] == ESCRITORES
+
+
+def test_lotes_concurrentes_con_escritores_sueltos(client):
+    rutina = client.post("/api/rutinas", json={"nombre": "Base"}).json()
+
+    def lote(i):
+        operaciones = [
+            {"metodo": "POST", "ruta": f"/api/rutinas/{rutina['id']}/ejercicios", "body": ejercicio(f"Remo {i}")},
+            {"metodo": "GET", "ruta": "/api/sync", "params": {"since": 0}},
+        ]
+        return lambda cliente: cliente.post("/api/batch", json={"operaciones": operaciones, "atomico": i % 2 == 0})
+
+    def suelto(i):
+        return lambda cliente: cliente.post(f"/api/rutinas/{rutina['id']}/ejercicios", json=ejercicio(f"Curl {i}"))
+
+    pedidos = [f(i) for i in range(ESCRITORES // 2) for f in (lote, suelto)]
+    respuestas = _en_paralelo(pedidos)
+    assert all(r.status_code in (200, 201) for r in respuestas)
+    assert all(r.json()["confirmado"] for r in respuestas[::2])
+    assert len(client.get(f"/api/rutinas/{rutina['id']}").json()["ejercicios"]) == ESCRITORES
+
+
+def test_flujo_de_rutina_y_calendario(client):
+    rutina = client.post("/api/rutinas", json={"nombre": "Pierna", "ejercicios": [ejercicio("Sentadilla")]}).json()
+    agregado = client.post(f"/api/rutinas/{rutina['id']}/ejercicios", json=ejercicio("Prensa", "Martes")).json()
+    assert client.put(f"/api/ejercicios/{agregado['id']}", json={"series": 5}).json()["series"] == 5
+    copia = client.post(f"/api/rutinas/{rutina['id']}/duplicar").json()
+    assert sorted(e["nombre"] for e in copia["ejercicios"]) == ["Prensa", "Sentadilla"]
+
+    plan = client.post("/api/planificaciones", json={"fecha": "2026-02-02", "rutina_id": rutina["id"]}).json()
+    assert client.delete(f"/api/rutinas/{rutina['id']}").status_code == 409
+    assert client.put(f"/api/planificaciones/{plan['id']}", json={"rutina_id": copia["id"]}).status_code == 200
+    assert client.delete(f"/api/rutinas/{rutina['id']}").status_code == 204
+    assert [p["rutina_id"] for p in client.get("/api/planificaciones").json()] == [copia["id"]]
@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+from sqlalchemy import text
+
+from app import eventos
+from app.database import engine
+
+""" Feed de cambios: difusión entre workers y tandas de NOTIFY """
+
+
+def test_sondeo_entrega_cambios_de_otro_worker(client):
+    async def escenario():
+        cola = eventos.difusor.suscribir()
+        try:
+            token = eventos.sondear(None)
+            # Otro worker confirma una escritura: solo queda en `cambios`
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO cambios (entidad, entidad_id, operacion) VALUES ('rutina', 7, 'upsert')")
+                )
+            nuevo = eventos.sondear(token)
+            return nuevo, await asyncio.wait_for(cola.get(), 2)
+        finally:
+            eventos.difusor.desuscribir(cola)
+
+    token, evento = asyncio.run(escenario())
+    assert evento == {"entidad": "rutina", "id": 7, "operacion": "upsert", "version": token}
+
+
+def test_notify_agrupa_eventos_por_debajo_del_limite():
+    lote = [{"entidad": "ejercicio", "id": i, "operacion": "delete", "version": 1000 + i} for i in range(500)]
+    tandas = eventos._tandas_payload(lote)
+    assert 1 < len(tandas) < 10
+    assert all(len(t.encode()) <= eventos.MAX_PAYLOAD for t in tandas)
+    assert [e for t in tandas for e in json.loads(t)] == lote
@@ -0,0 +1,45 @@
+import asyncio
+
+import httpx
+
+from app import idempotencia
+
+""" Idempotency-Key: reintentos y reservas de requests largos """
+
+
+def test_reintento_devuelve_la_respuesta_guardada(client):
+    headers = {"Idempotency-Key": "crear-1"}
+    primera = client.post("/api/rutinas", json={"nombre": "Fuerza"}, headers=headers)
+    segunda = client.post("/api/rutinas", json={"nombre": "Fuerza"}, headers=headers)
+    assert segunda.status_code == primera.status_code == 201
+    assert segunda.json() == primera.json()
+    assert segunda.headers["idempotent-replayed"] == "true"
+    assert client.get("/api/rutinas").json()["total"] == 1
+
+
+def test_reserva_se_renueva_mientras_el_request_sigue(monkeypatch):
+    # Un request más largo que TTL_EN_CURSO no debe ejecutarse dos veces
+    monkeypatch.setattr(idempotencia, "TTL_EN_CURSO", 0.1)
+    monkeypatch.setattr(idempotencia, "RENOVAR_CADA", 0.03)
+    ejecuciones = []
+
+    async def lenta(scope, receive, send):
+        await receive()
+        ejecuciones.append(1)
+        await asyncio.sleep(0.4)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=idempotencia.IdempotenciaMiddleware(lenta))
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+            headers = {"Idempotency-Key": "lenta-1"}
+            primera = asyncio.ensure_future(cliente.post("/lenta", headers=headers))
+            await asyncio.sleep(0.25)
+            segunda = await cliente.post("/lenta", headers=headers)
+            return await primera, segunda
+
+    primera, segunda = asyncio.run(escenario())
+    assert primera.status_code == segunda.status_code == 200
+    assert segunda.headers["idempotent-replayed"] == "true"
+    assert len(ejecuciones) == 1
@@ -0,0 +1,62 @@
+from conftest import ejercicio
+
+""" Cantidad de sentencias SQL por endpoint de escritura (SQLite, perfil ajustado) """
+
+# BEGIN y los INSERT en `cambios` cuentan; un valor mayor suele ser un refresh o un lazy load nuevo.
+# Cada request escribe en una sola transacción: un lazy load al serializar abriría una segunda
+ESPERADAS = {
+    "POST /api/rutinas": 7,
+    "PUT /api/rutinas/{id}": 5,
+    "POST /api/rutinas/{id}/ejercicios": 4,
+    "PUT /api/ejercicios/{id}": 4,
+    "DELETE /api/ejercicios/{id}": 4,
+    "POST /api/rutinas/{id}/duplicar": 10,
+    "POST /api/planificaciones": 7,
+    "PUT /api/planificaciones/{id}": 7,
+    "DELETE /api/planificaciones/{id}": 4,
+    "DELETE /api/rutinas/{id}": 10,
+}
+
+
+def test_sentencias_por_endpoint_de_escritura(client, sentencias):
+    medidas = {}
+    transacciones = {}
+
+    def medir(clave, llamada):
+        sentencias.clear()
+        respuesta = llamada()
+        assert respuesta.status_code < 300, (clave, respuesta.text)
+        medidas[clave] = len(sentencias)
+        transacciones[clave] = sum(s.startswith("BEGIN") for s in sentencias)
+        return respuesta
+
+    rutina = medir(
+        "POST /api/rutinas",
+        lambda: client.post(
+            "/api/rutinas",
+            json={"nombre": "A", "ejercicios": [ejercicio("Sentadilla"), ejercicio("Press", "Martes")]},
+        ),
+    ).json()["id"]
+    medir("PUT /api/rutinas/{id}", lambda: client.put(f"/api/rutinas/{rutina}", json={"descripcion": "x"}))
+    ej = medir(
+        "POST /api/rutinas/{id}/ejercicios",
+        lambda: client.post(f"/api/rutinas/{rutina}/ejercicios", json=ejercicio("Remo")),
+    ).json()["id"]
+    medir("PUT /api/ejercicios/{id}", lambda: client.put(f"/api/ejercicios/{ej}", json={"series": 5}))
+    medir("DELETE /api/ejercicios/{id}", lambda: client.delete(f"/api/ejercicios/{ej}"))
+    copia = medir(
+        "POST /api/rutinas/{id}/duplicar", lambda: client.post(f"/api/rutinas/{rutina}/duplicar")
+    ).json()["id"]
+    plan = medir(
+        "POST /api/planificaciones",
+        lambda: client.post("/api/planificaciones", json={"fecha": "2026-01-05", "rutina_id": rutina}),
+    ).json()["id"]
+    medir(
+        "PUT /api/planificaciones/{id}",
+        lambda: client.put(f"/api/planificaciones/{plan}", json={"fecha": "2026-01-06"}),
+    )
+    medir("DELETE /api/planificaciones/{id}", lambda: client.delete(f"/api/planificaciones/{plan}"))
+    medir("DELETE /api/rutinas/{id}", lambda: client.delete(f"/api/rutinas/{copia}"))
+
+    assert medidas == ESPERADAS
+    assert transacciones == dict.fromkeys(ESPERADAS, 1)
@@ -0,0 +1,36 @@
+import time
+
+from app import similares
+from conftest import ejercicio
+
+""" Rutinas similares: el índice se arma fuera del request y después sigue los cambios """
+
+EJERCICIOS = [ejercicio("Sentadilla"), ejercicio("Press Banca"), ejercicio("Remo", "Martes")]
+
+
+def _similares(client, rutina_id):
+    """Consulta hasta que el índice esté listo (503 mientras se construye)."""
+    for _ in range(100):
+        resp = client.get(f"/api/rutinas/{rutina_id}/similares")
+        if resp.status_code != 503:
+            return resp
+        assert resp.headers["Retry-After"] == "1"
+        time.sleep(0.05)
+    raise AssertionError("el índice de similares no terminó de construirse")
+
+
+def test_responde_503_hasta_que_el_indice_esta_listo(client):
+    a = client.post("/api/rutinas", json={"nombre": "A", "ejercicios": EJERCICIOS}).json()
+    b = client.post("/api/rutinas", json={"nombre": "B", "ejercicios": EJERCICIOS}).json()
+
+    similares.indice.invalidar()
+    resp = client.get(f"/api/rutinas/{a['id']}/similares")
+    assert resp.status_code == 503
+
+    resp = _similares(client, a["id"])
+    assert resp.status_code == 200
+    assert [r["id"] for r in resp.json()] == [b["id"]]
+
+    # Ya listo, las rutinas nuevas llegan por el registro de cambios sin reconstruir
+    c = client.post("/api/rutinas", json={"nombre": "C", "ejercicios": EJERCICIOS}).json()
+    assert {r["id"] for r in client.get(f"/api/rutinas/{a['id']}/similares").json()} == {b["id"], c["id"]}
@@ -0,0 +1,24 @@
+from app import sugerencias
+from conftest import ejercicio
+
+""" Autocompletado: el índice sigue el registro de cambios sin reconstruirse """
+
+
+def _sugerir(client, q):
+    return [(s["nombre"], s["frecuencia"]) for s in client.get("/api/ejercicios/sugerencias", params={"q": q}).json()]
+
+
+def test_indice_sigue_altas_renombres_y_bajas(client, monkeypatch):
+    monkeypatch.setattr(sugerencias, "ACTUALIZAR_CADA", 0.0)
+    rutina = client.post("/api/rutinas", json={"nombre": "A", "ejercicios": [ejercicio("Press Banca")]}).json()
+    assert _sugerir(client, "pre") == [("Press Banca", 1)]
+
+    client.post("/api/rutinas", json={"nombre": "B", "ejercicios": [ejercicio("press banca")]}).json()
+    assert _sugerir(client, "banca") == [("Press Banca", 2)]
+
+    client.put(f"/api/ejercicios/{rutina['ejercicios'][0]['id']}", json={"nombre": "Prensa"})
+    assert _sugerir(client, "pre") == [("Prensa", 1), ("Press Banca", 1)]
+
+    # El borrado masivo no pasa por el ORM: llega solo por el registro de cambios
+    client.post("/api/rutinas/eliminar", json={"nombre": "B"})
+    assert [nombre for nombre, _ in _sugerir(client, "pre")] == ["Prensa"]
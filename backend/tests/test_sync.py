@@ -0,0 +1,19 @@
+from conftest import ejercicio
+
+""" Sincronización incremental por token """
+
+
+def test_solo_token_y_deltas_desde_el_token(client):
+    vacio = client.get("/api/sync", params={"solo_token": True}).json()
+    assert vacio["token"] == 0 and vacio["rutinas"] == []
+
+    rutina = client.post("/api/rutinas", json={"nombre": "A", "ejercicios": [ejercicio("Remo")]}).json()
+    # since=0 es un token válido (todo lo posterior al inicio), no una instantánea
+    delta = client.get("/api/sync", params={"since": 0}).json()
+    assert [r["id"] for r in delta["rutinas"]] == [rutina["id"]]
+    assert [e["nombre"] for e in delta["ejercicios"]] == ["Remo"]
+
+    client.delete(f"/api/ejercicios/{rutina['ejercicios'][0]['id']}")
+    siguiente = client.get("/api/sync", params={"since": delta["token"]}).json()
+    assert siguiente["eliminados"] == [{"entidad": "ejercicio", "id": rutina["ejercicios"][0]["id"]}]
+    assert siguiente["rutinas"] == []
@@ -1,19 +1,12 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import {
-  addEjercicio,
-  createRutina,
-  deleteEjercicio,
-  deleteRutina,
   fetchRutinas,
   fetchStats,
   fetchPlanificaciones,
+  fetchSync,
+  runBatch,
+  suscribirCambios,
   searchRutinas,
-  updateEjercicio,
-  updateRutina,
-  duplicateRutina,
-  createPlanificacion,
-  updatePlanificacion,
-  deletePlanificacion,
   exportRutinas,
 } from "./api";
 
@@ -60,6 +53,16 @@ function App() {
   const [activeTab, setActiveTab] = useState("listar"); // listar | crear | estadisticas
   const [dragData, setDragData] = useState(null); // { ejercicioId, dia, rutinaId }
   const [plans, setPlans] = useState([]); // {id, fecha, rutina_id, rutina?}
+  const [statsVersion, setStatsVersion] = useState(0); // sube cuando cambian rutinas/ejercicios
+
+  // Sincronización por deltas: token de /api/sync y cola para no solapar pedidos
+  const tokenSync = useRef(null);
+  const colaSync = useRef(Promise.resolve());
+  const timerSync = useRef(null);
+  const rutinasRef = useRef(rutinas);
+  rutinasRef.current = rutinas;
+  const recargarLista = useRef(null);
+  const montado = useRef(false);
 
   // Agrupa ejercicios por día para mostrarlos ordenados
   const ejerciciosPorDia = (ejercicios) =>
@@ -71,6 +74,27 @@ function App() {
       return acc;
     }, {});
 
+  // Operación de lote que trae la lista visible (página con filtros o búsqueda)
+  const opLista = () =>
+    busqueda
+      ? { metodo: "GET", ruta: "/api/rutinas/buscar", params: { nombre: busqueda } }
+      : {
+          metodo: "GET",
+          ruta: "/api/rutinas",
+          params: {
+            limit: pageSize,
+            offset: (page - 1) * pageSize,
+            dia_semana: filtroDia || undefined,
+            ejercicio: filtroEjercicio || undefined,
+          },
+        };
+
+  const aplicarLista = (data) => {
+    const items = data?.items ?? data ?? [];
+    setRutinas(items);
+    setTotal(data?.total ?? items.length ?? 0);
+  };
+
   // Carga inicial de rutinas
   const cargarRutinas = async () => {
     setCargando(true);
@@ -97,17 +121,169 @@ function App() {
   };
 
   useEffect(() => {
+    // Al montar, la lista llega en el lote inicial
+    if (!montado.current) {
+      montado.current = true;
+      return;
+    }
     if (!busqueda) {
       cargarRutinas();
     }
   }, [page, filtroDia, filtroEjercicio]);
 
+  // Lista visible (página o búsqueda); la usan los deltas que agregan o quitan rutinas
+  recargarLista.current = () => (busqueda ? buscar(busqueda) : cargarRutinas());
+
   useEffect(() => {
-    cargarRutinas();
-    cargarStats();
-    cargarPlanificaciones();
+    // Dashboard en un solo round trip. El token va primero en el lote: lo escrito
+    // después de leerlo llega como delta
+    const iniciar = async () => {
+      setCargando(true);
+      try {
+        const resp = await runBatch([
+          { metodo: "GET", ruta: "/api/sync", params: { solo_token: true } },
+          opLista(),
+          { metodo: "GET", ruta: "/api/estadisticas" },
+          { metodo: "GET", ruta: "/api/planificaciones" },
+        ]);
+        const [token, lista, estadisticas, planes] = resp.data.resultados;
+        tokenSync.current = token.status === 200 ? token.body.token : null;
+        if (lista.status === 200) aplicarLista(lista.body);
+        else setError("No se pudieron cargar las rutinas");
+        setStats(estadisticas.status === 200 ? estadisticas.body : null);
+        setPlans(planes.status === 200 ? planes.body : []);
+      } catch (e) {
+        setError("No se pudieron cargar las rutinas");
+      } finally {
+        setCargando(false);
+      }
+    };
+    iniciar();
+    const cerrar = suscribirCambios(programarSync, programarSync, programarSync);
+    return () => {
+      cerrar();
+      clearTimeout(timerSync.current);
+    };
   }, []);
 
+  useEffect(() => {
+    if (activeTab === "estadisticas" && statsVersion > 0) {
+      cargarStats();
+    }
+  }, [activeTab, statsVersion]);
+
+  // Aplica un delta de /api/sync sobre el estado local en lugar de recargar todo
+  // Con `conLista` la página ya viene en el mismo lote: solo se tocan calendario y stats
+  const aplicarDelta = (delta, { conLista = false } = {}) => {
+    const borrados = { rutina: new Set(), ejercicio: new Set(), planificacion: new Set() };
+    delta.eliminados.forEach((e) => borrados[e.entidad]?.add(e.id));
+
+    // Rutinas nuevas o borradas cambian la página (orden y total): se recarga solo la lista
+    const visibles = new Set(rutinasRef.current.map((r) => r.id));
+    if (conLista) {
+      // nada: la lista del lote ya incluye el delta
+    } else if (borrados.rutina.size || delta.rutinas.some((r) => !visibles.has(r.id))) {
+      recargarLista.current?.();
+    } else if (delta.rutinas.length || delta.ejercicios.length || borrados.ejercicio.size) {
+      const rutinasPorId = new Map(delta.rutinas.map((r) => [r.id, r]));
+      setRutinas((prev) =>
+        prev.map((r) => {
+          const nuevos = delta.ejercicios.filter((e) => e.rutina_id === r.id);
+          const ids = new Set(nuevos.map((e) => e.id));
+          const ejercicios = (r.ejercicios || []).filter(
+            (e) => !borrados.ejercicio.has(e.id) && !ids.has(e.id)
+          );
+          return { ...r, ...rutinasPorId.get(r.id), ejercicios: [...ejercicios, ...nuevos] };
+        })
+      );
+    }
+
+    if (delta.planificaciones.length || borrados.planificacion.size || delta.rutinas.length) {
+      const nombres = new Map(
+        [...rutinasRef.current, ...delta.rutinas].map((r) => [r.id, { id: r.id, nombre: r.nombre }])
+      );
+      setPlans((prev) => {
+        const porId = new Map(prev.map((p) => [p.id, p]));
+        borrados.planificacion.forEach((id) => porId.delete(id));
+        delta.planificaciones.forEach((p) => {
+          const previo = porId.get(p.id);
+          const rutina = previo?.rutina_id === p.rutina_id ? previo.rutina : undefined;
+          porId.set(p.id, { ...p, rutina });
+        });
+        // Rutina asignada (nueva o renombrada) con el nombre más reciente que se conozca
+        return [...porId.values()].map((p) => ({
+          ...p,
+          rutina: nombres.get(p.rutina_id) ?? p.rutina,
+        }));
+      });
+    }
+
+    const tocaRutinas = delta.rutinas.length || delta.ejercicios.length;
+    if (tocaRutinas || borrados.rutina.size || borrados.ejercicio.size) {
+      setStatsVersion((v) => v + 1);
+    }
+  };
+
+  // Trae los cambios desde el token; las llamadas se encolan y el delta se aplica en orden
+  const sincronizar = () => {
+    colaSync.current = colaSync.current.then(async () => {
+      if (tokenSync.current === null) return;
+      try {
+        let hayMas = true;
+        while (hayMas) {
+          const resp = await fetchSync(tokenSync.current);
+          aplicarDelta(resp.data);
+          tokenSync.current = resp.data.token;
+          hayMas = resp.data.hay_mas;
+        }
+      } catch (e) {
+        // El próximo evento (o reconexión del feed) vuelve a intentar desde el mismo token
+      }
+    });
+    return colaSync.current;
+  };
+
+  // Escrituras + delta (y la lista, si cambia la página) en un solo lote. Un fallo se
+  // relanza con la forma de un error de axios para que los handlers no cambien
+  const escribir = (operaciones, { conLista = false } = {}) => {
+    const tarea = colaSync.current.then(async () => {
+      const ops = [...operaciones];
+      const conSync = tokenSync.current !== null;
+      if (conSync) {
+        ops.push({ metodo: "GET", ruta: "/api/sync", params: { since: tokenSync.current } });
+      }
+      if (conLista) ops.push(opLista());
+      const resp = await runBatch(ops);
+      const resultados = resp.data.resultados;
+      const sync = conSync ? resultados[operaciones.length] : null;
+      if (sync?.status === 200) {
+        aplicarDelta(sync.body, { conLista });
+        tokenSync.current = sync.body.token;
+        if (sync.body.hay_mas) programarSync();
+      } else if (!conSync) {
+        // Sin token (falló la carga inicial): se vuelve a leer lo visible
+        if (!conLista) recargarLista.current?.();
+        cargarPlanificaciones();
+      }
+      if (conLista && resultados[resultados.length - 1].status === 200) {
+        aplicarLista(resultados[resultados.length - 1].body);
+      }
+      const fallida = resultados.slice(0, operaciones.length).find((r) => r.status >= 400);
+      if (fallida) {
+        throw { response: { status: fallida.status, data: fallida.body } };
+      }
+      return resultados;
+    });
+    colaSync.current = tarea.catch(() => null);
+    return tarea;
+  };
+
+  // Los eventos del feed llegan en ráfagas: se agrupan en un solo pedido de sync
+  const programarSync = () => {
+    clearTimeout(timerSync.current);
+    timerSync.current = setTimeout(sincronizar, 150);
+  };
+
   // Búsqueda en vivo por nombre
   const buscar = async (texto) => {
     setBusqueda(texto);
@@ -154,10 +330,12 @@ function App() {
           repeticiones: Number(ej.repeticiones),
           orden: ej.orden ? Number(ej.orden) : null,
         }));
-      await createRutina({ ...formRutina, ejercicios });
+      await escribir(
+        [{ metodo: "POST", ruta: "/api/rutinas", body: { ...formRutina, ejercicios } }],
+        { conLista: true }
+      );
       setFormRutina({ nombre: "", descripcion: "" });
       setEjerciciosNuevos([inicialEjercicio]);
-      await cargarRutinas();
     } catch (e) {
       setError(e.response?.data?.detail || "No se pudo crear la rutina");
     }
@@ -168,10 +346,9 @@ function App() {
   const eliminarRutinaHandler = async (id) => {
     if (!confirm("¿Eliminar la rutina y sus ejercicios?")) return;
     try {
-      await deleteRutina(id);
-      await cargarRutinas();
+      await escribir([{ metodo: "DELETE", ruta: `/api/rutinas/${id}` }], { conLista: true });
     } catch (e) {
-      setError("No se pudo eliminar");
+      setError(e.response?.data?.detail || "No se pudo eliminar la rutina");
     }
   };
 
@@ -189,14 +366,19 @@ function App() {
     const data = ejercicioPorRutina[rutinaId];
     if (!data?.nombre) return;
     try {
-      await addEjercicio(rutinaId, {
-        ...data,
-        peso: data.peso ? Number(data.peso) : null,
-        series: Number(data.series),
-        repeticiones: Number(data.repeticiones),
-        orden: data.orden ? Number(data.orden) : null,
-      });
-      await cargarRutinas();
+      await escribir([
+        {
+          metodo: "POST",
+          ruta: `/api/rutinas/${rutinaId}/ejercicios`,
+          body: {
+            ...data,
+            peso: data.peso ? Number(data.peso) : null,
+            series: Number(data.series),
+            repeticiones: Number(data.repeticiones),
+            orden: data.orden ? Number(data.orden) : null,
+          },
+        },
+      ]);
       prepararEjercicioRutina(rutinaId);
     } catch (e) {
       setError("No se pudo agregar el ejercicio");
@@ -222,15 +404,20 @@ function App() {
   const guardarEdicionEjercicio = async (ejercicioId) => {
     const data = ejercicioPorRutina[`edit-${ejercicioId}`];
     try {
-      await updateEjercicio(ejercicioId, {
-        ...data,
-        peso: data.peso ? Number(data.peso) : null,
-        series: Number(data.series),
-        repeticiones: Number(data.repeticiones),
-        orden: data.orden ? Number(data.orden) : null,
-      });
+      await escribir([
+        {
+          metodo: "PUT",
+          ruta: `/api/ejercicios/${ejercicioId}`,
+          body: {
+            ...data,
+            peso: data.peso ? Number(data.peso) : null,
+            series: Number(data.series),
+            repeticiones: Number(data.repeticiones),
+            orden: data.orden ? Number(data.orden) : null,
+          },
+        },
+      ]);
       setEditandoEjercicio(null);
-      await cargarRutinas();
     } catch (e) {
       setError("No se pudo actualizar el ejercicio");
     }
@@ -241,8 +428,7 @@ function App() {
   const eliminarEjercicioHandler = async (id) => {
     if (!confirm("¿Eliminar ejercicio?")) return;
     try {
-      await deleteEjercicio(id);
-      await cargarRutinas();
+      await escribir([{ metodo: "DELETE", ruta: `/api/ejercicios/${id}` }]);
     } catch (e) {
       setError("No se pudo eliminar el ejercicio");
     }
@@ -254,8 +440,7 @@ function App() {
     const nuevo = prompt("Nuevo nombre:", rutina.nombre);
     if (!nuevo || nuevo === rutina.nombre) return;
     try {
-      await updateRutina(rutina.id, { nombre: nuevo });
-      await cargarRutinas();
+      await escribir([{ metodo: "PUT", ruta: `/api/rutinas/${rutina.id}`, body: { nombre: nuevo } }]);
     } catch (e) {
       setError(e.response?.data?.detail || "No se pudo actualizar la rutina");
     }
@@ -269,8 +454,16 @@ function App() {
       `${rutina.nombre} (copia)`
     );
     try {
-      await duplicateRutina(rutina.id, nuevo || undefined);
-      await cargarRutinas();
+      await escribir(
+        [
+          {
+            metodo: "POST",
+            ruta: `/api/rutinas/${rutina.id}/duplicar`,
+            body: nuevo ? { nombre: nuevo } : {},
+          },
+        ],
+        { conLista: true }
+      );
     } catch (e) {
       setError(e.response?.data?.detail || "No se pudo duplicar la rutina");
     }
@@ -352,12 +545,14 @@ function App() {
 
     // Reasignar orden secuencial en este día
     try {
-      await Promise.all(
-        ejerciciosDia.map((e, idx) =>
-          updateEjercicio(e.id, { orden: idx + 1 }).catch(() => null)
-        )
-      );
-      await cargarRutinas();
+      // Todos los cambios de orden en un solo lote (antes, un PUT por ejercicio)
+      await escribir(
+        ejerciciosDia.map((e, idx) => ({
+          metodo: "PUT",
+          ruta: `/api/ejercicios/${e.id}`,
+          body: { orden: idx + 1 },
+        }))
+      ).catch(() => null);
     } finally {
       setDragData(null);
     }
@@ -384,12 +579,15 @@ function App() {
   const guardarPlan = async (fecha, rutinaId) => {
     const existente = planPorFecha[fecha];
     try {
-      if (existente) {
-        await updatePlanificacion(existente.id, { rutina_id: rutinaId, fecha });
-      } else {
-        await createPlanificacion({ fecha, rutina_id: rutinaId });
-      }
-      await cargarPlanificaciones();
+      await escribir([
+        existente
+          ? {
+              metodo: "PUT",
+              ruta: `/api/planificaciones/${existente.id}`,
+              body: { rutina_id: rutinaId, fecha },
+            }
+          : { metodo: "POST", ruta: "/api/planificaciones", body: { fecha, rutina_id: rutinaId } },
+      ]);
     } catch (e) {
       setError("No se pudo guardar la planificación");
     }
@@ -401,8 +599,7 @@ function App() {
     const existente = planPorFecha[fecha];
     if (!existente) return;
     try {
-      await deletePlanificacion(existente.id);
-      await cargarPlanificaciones();
+      await escribir([{ metodo: "DELETE", ruta: `/api/planificaciones/${existente.id}` }]);
     } catch (e) {
       setError("No se pudo eliminar la planificación");
     }
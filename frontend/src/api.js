@@ -19,6 +19,21 @@ export const fetchPlanificaciones = () => api.get("/api/planificaciones");
 export const createPlanificacion = (data) => api.post("/api/planificaciones", data);
 export const updatePlanificacion = (id, data) => api.put(`/api/planificaciones/${id}`, data);
 export const deletePlanificacion = (id) => api.delete(`/api/planificaciones/${id}`);
+// Lote: [{ metodo, ruta, params?, body? }] en un solo request; atomico => todo o nada
+export const runBatch = (operaciones, atomico = false) =>
+  api.post("/api/batch", { operaciones, atomico });
+export const fetchSync = (since) => api.get("/api/sync", { params: { since } });
+// Solo el token actual (el estado inicial se carga con los endpoints de siempre)
+export const fetchSyncToken = () => api.get("/api/sync", { params: { solo_token: true } });
+// Feed SSE de cambios: onCambio recibe {entidad, id, operacion, version}.
+// onAbierto corre al conectar y en cada reconexión (para cubrir lo perdido mientras tanto)
+export const suscribirCambios = (onCambio, onResync, onAbierto) => {
+  const fuente = new EventSource(`${api.defaults.baseURL}/api/eventos`);
+  fuente.addEventListener("cambio", (e) => onCambio(JSON.parse(e.data)));
+  fuente.addEventListener("resync", () => onResync?.());
+  fuente.addEventListener("open", () => onAbierto?.());
+  return () => fuente.close();
+};
 export const exportRutinas = (formato = "csv") =>
   api.get("/api/rutinas/export", { params: { formato }, responseType: "blob" });
 